@@ -4,6 +4,7 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from database import engine_options, configure_engine
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -22,12 +23,9 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
 
-# Configure the database
+# Configure the database; see database.py for the per-backend pool and SQLite settings
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///research_assistant.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
 
 # Initialize the app with the extension
 db.init_app(app)
@@ -36,13 +34,26 @@ db.init_app(app)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs('models_cache', exist_ok=True)
 
-with app.app_context():
-    # Import models to ensure tables are created
-    import models
-    db.create_all()
-
-# Import routes
-from routes import *
+# Spawned PDF extraction processes re-run the entry script as __mp_main__;
+# they only need services.document_processor, not the database or routes
+if __name__ != '__mp_main__':
+    with app.app_context():
+        configure_engine(db.engine)
+        
+        # Import models to ensure tables are created
+        import models
+        db.create_all()
+        
+        from migrations import upgrade_schema
+        upgrade_schema(db)
+    
+    # Import routes
+    from routes import *
 
 if __name__ == '__main__':
+    from services.model_registry import ModelRegistry
+    ModelRegistry.warm_up_async()
+    # The reloader runs this twice; only its child process serves requests and runs jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ingestion_service.resume_interrupted()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,133 @@
+"""Question history latency before and after the history indexes.
+
+Run from the project folder:
+
+    python -m benchmarks.history --questions 1000000
+
+Builds a scratch SQLite database (never the application's own) holding
+--questions questions spread over --documents documents, without the
+Question indexes, like a database created before they existed. History pages
+are requested through the Flask test client: the first page of random
+documents, then --depth further pages following X-Next-Cursor. The indexes are
+then added by migrations.upgrade_schema, the same path an existing
+instance/research_assistant.db takes at startup, and the requests repeated.
+"""
+import os
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+HISTORY_INDEXES = ('ix_question_document_id_created_date', 'ix_question_document_id_context_hash')
+
+HISTORY_SQL = 'SELECT id FROM question WHERE document_id = 1 ORDER BY created_date DESC, id DESC LIMIT 51'
+
+def populate(db, Document, Question, documents: int, questions: int, rng: random.Random, batch_size: int = 50000):
+    """Insert documents and questions with increasing creation dates"""
+    start = datetime(2024, 1, 1)
+    db.session.execute(Document.__table__.insert(), [
+        {
+            'id': document_id,
+            'filename': f'benchmark_{document_id}.txt',
+            'original_filename': f'benchmark_{document_id}.txt',
+            'file_path': '',
+            'file_type': 'txt',
+            'upload_date': start,
+            'processed': True
+        }
+        for document_id in range(1, documents + 1)
+    ])
+
+    for offset in range(0, questions, batch_size):
+        db.session.execute(Question.__table__.insert(), [
+            {
+                'document_id': rng.randint(1, documents),
+                'question_text': f'Benchmark question {i}?',
+                'question_type': 'user',
+                'answer': 'Benchmark answer. ' * 10,
+                'created_date': start + timedelta(seconds=i)
+            }
+            for i in range(offset, min(offset + batch_size, questions))
+        ])
+    db.session.commit()
+
+def measure(client, documents: int, requests: int, depth: int, rng: random.Random):
+    """Latencies in milliseconds of first pages and of pages reached by cursor"""
+    first_pages, later_pages = [], []
+    for _ in range(requests):
+        url = f'/api/document/{rng.randint(1, documents)}/history'
+
+        started = time.perf_counter()
+        response = client.get(url)
+        first_pages.append(1000 * (time.perf_counter() - started))
+
+        for _ in range(depth):
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+            started = time.perf_counter()
+            response = client.get(url, query_string={'before': cursor})
+            later_pages.append(1000 * (time.perf_counter() - started))
+
+    return first_pages, later_pages
+
+def percentile(latencies, fraction: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] if latencies else float('nan')
+
+def query_plan(db, text) -> str:
+    return '; '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {HISTORY_SQL}')))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--documents', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=20, help='documents whose history is requested')
+    parser.add_argument('--depth', type=int, default=3, help='further pages followed per document')
+    parser.add_argument('--db', default='/tmp/history_benchmark.db', help='scratch database file, recreated')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    # Must be set before the app is imported, which creates the tables
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(args.db)}"
+
+    from sqlalchemy import text
+    from app import app, db
+    from models import Document, Question
+    from migrations import upgrade_schema
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        # Start from the schema of a database that predates the indexes
+        for name in HISTORY_INDEXES:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        db.session.commit()
+
+        started = time.perf_counter()
+        populate(db, Document, Question, args.documents, args.questions, rng)
+        print(f"Inserted {args.questions} questions over {args.documents} documents "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        client = app.test_client()
+        results = {'without indexes': (measure(client, args.documents, args.requests, args.depth, rng), query_plan(db, text))}
+
+        # Release the session's connection so the migration can write
+        db.session.commit()
+        started = time.perf_counter()
+        upgrade_schema(db)
+        print(f"Migration added the indexes in {time.perf_counter() - started:.1f}s")
+        db.session.execute(text('ANALYZE'))
+
+        results['with indexes'] = (measure(client, args.documents, args.requests, args.depth, rng), query_plan(db, text))
+
+    print(f"{'':<18}{'first p50':>11}{'first p95':>11}{'next p50':>11}{'next p95':>11}  (ms)")
+    for name, ((first_pages, later_pages), _) in results.items():
+        print(f"{name:<18}{percentile(first_pages, 0.5):>11.2f}{percentile(first_pages, 0.95):>11.2f}"
+              f"{percentile(later_pages, 0.5):>11.2f}{percentile(later_pages, 0.95):>11.2f}")
+    for name, (_, plan) in results.items():
+        print(f"Plan {name}: {plan}")
+
+if __name__ == '__main__':
+    main()
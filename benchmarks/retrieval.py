@@ -0,0 +1,101 @@
+"""Recall vs latency of the retrieval modes on the stored uploads.
+
+Run from the project folder:
+
+    python -m benchmarks.retrieval --queries 200 --k 5
+
+The uploads have no relevance labels, so queries are made from the documents
+themselves: a sentence is taken from a random chunk and a share of its words
+(--drop) is removed so it no longer matches verbatim. Every chunk of the same
+document containing the full sentence counts as relevant. For each mode the
+script reports recall@k (share of queries with a relevant chunk in the top k),
+mean reciprocal rank and per-query latency. Query embeddings and retrievals
+are not cached between modes, so every mode pays for its own query encoding.
+"""
+import re
+import time
+import random
+import argparse
+import statistics
+
+from app import app
+from models import Document
+from services.vector_store import VectorStore, RETRIEVAL_MODES
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def make_queries(store: VectorStore, document_ids, count: int, drop: float, rng: random.Random):
+    """(document ID, query, relevant chunk indices) tuples sampled from the stored chunks"""
+    candidates = []
+    for document_id in document_ids:
+        chunks = store.get_document_chunks(document_id)
+        for chunk in chunks:
+            for sentence in SENTENCE_BOUNDARY.split(chunk['text']):
+                if 8 <= len(sentence.split()) <= 40:
+                    candidates.append((document_id, sentence, chunks))
+
+    queries = []
+    for document_id, sentence, chunks in rng.sample(candidates, min(count, len(candidates))):
+        words = sentence.split()
+        kept = [word for word in words if rng.random() >= drop] or words[:1]
+        relevant = {i for i, chunk in enumerate(chunks) if sentence in chunk['text']}
+        queries.append((document_id, ' '.join(kept), relevant))
+    return queries
+
+def run_mode(store: VectorStore, queries, k: int, mode: str):
+    """Recall@k, MRR and latency percentiles of one retrieval mode"""
+    store.query_embeddings.clear()
+    store.retrievals.clear()
+
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for document_id, query, relevant in queries:
+        chunks = store.get_document_chunks(document_id)
+        started = time.perf_counter()
+        texts = store.search_similar(document_id, query, k, mode=mode)
+        latencies.append(1000 * (time.perf_counter() - started))
+
+        ranks = [rank for rank, text in enumerate(texts, 1)
+                 if any(chunks[i]['text'] == text for i in relevant)]
+        hits += bool(ranks)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+
+    latencies.sort()
+    return {
+        'recall': hits / len(queries),
+        'mrr': statistics.mean(reciprocal_ranks),
+        'p50_ms': latencies[len(latencies) // 2],
+        'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=200, help='number of sampled queries')
+    parser.add_argument('--k', type=int, default=5, help='chunks retrieved per query')
+    parser.add_argument('--drop', type=float, default=0.3, help='share of query words removed')
+    parser.add_argument('--modes', default=','.join(RETRIEVAL_MODES), help='comma-separated retrieval modes')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with app.app_context():
+        document_ids = [document.id for document in Document.query.filter_by(processed=True)]
+
+    store = VectorStore()
+    queries = make_queries(store, document_ids, args.queries, args.drop, random.Random(args.seed))
+    if not queries:
+        print("No processed documents with chunks found")
+        return
+
+    # Load models and shards before timing anything
+    store.search_similar(queries[0][0], queries[0][1], args.k, mode='rerank')
+
+    print(f"{len(queries)} queries over {len(document_ids)} documents, k={args.k}")
+    print(f"{'mode':<10}{'recall@k':>10}{'mrr':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode in args.modes.split(','):
+        result = run_mode(store, queries, args.k, mode)
+        print(f"{mode:<10}{result['recall']:>10.3f}{result['mrr']:>8.3f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+
+    if store.reranker.queries:
+        print(f"reranker: {store.reranker.stats()}")
+
+if __name__ == '__main__':
+    main()
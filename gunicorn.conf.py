@@ -0,0 +1,43 @@
+# Gunicorn configuration for the AI Research Assistant
+#
+# By default every AI model is loaded once in the master process before
+# workers fork, so workers share the model weights copy-on-write instead of
+# each loading their own copy. Set PRELOAD_MODELS=0 to start serving
+# immediately and load the models on a background thread in each worker.
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Split the machine's cores between workers so their LLM context pools
+# do not oversubscribe the CPU
+os.environ.setdefault("LLM_CPU_CORES", str(max(1, (os.cpu_count() or 1) // workers)))
+timeout = 120
+preload_app = True
+
+
+def on_starting(server):
+    if os.environ.get("PRELOAD_MODELS", "1") == "1":
+        from services.model_registry import ModelRegistry
+        ModelRegistry.preload()
+
+
+def post_fork(server, worker):
+    # The master connected to the database while importing the app; each
+    # worker must open its own connections instead of sharing those sockets
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # No-op for models already preloaded in the master
+    from services.model_registry import ModelRegistry
+    ModelRegistry.warm_up_async()
+
+    # The first worker resumes every job interrupted by the previous shutdown.
+    # Workers started later, e.g. to replace one that died, resume only jobs
+    # that have been running longer than INGESTION_STALE_SECONDS
+    from routes import ingestion_service
+    ingestion_service.resume_interrupted(stale_only=worker.age != 1)
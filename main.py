@@ -1,4 +1,15 @@
-from app import app
+import os
+
+# Spawned PDF extraction processes re-run this script as __mp_main__; they only
+# need services.document_processor, so they skip importing (and setting up) the app
+if __name__ != '__mp_main__':
+    from app import app
+    from services.model_registry import ModelRegistry
+    from routes import ingestion_service
 
 if __name__ == '__main__':
+    ModelRegistry.warm_up_async()
+    # The reloader runs this twice; only its child process serves requests and runs jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ingestion_service.resume_interrupted()
     app.run(host='0.0.0.0', port=5000, debug=True)
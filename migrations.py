@@ -0,0 +1,102 @@
+import os
+import logging
+from sqlalchemy import inspect, text, update
+
+logger = logging.getLogger(__name__)
+
+def upgrade_schema(db):
+    """Bring an existing database up to date with the models.
+
+    db.create_all() only creates missing tables, so columns and indexes added
+    to existing models are applied here. New columns must be nullable.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    logger.info(f"Created index {index.name}")
+
+    _backfill_content_hashes(db)
+    _backfill_summary_previews(db)
+    _move_content_to_store(db)
+
+def _backfill_content_hashes(db):
+    """Hash the stored files of documents uploaded before deduplication existed"""
+    from models import Document
+    from services.document_processor import DocumentProcessor
+
+    hashed = 0
+    for document in Document.query.filter(Document.content_hash.is_(None)).all():
+        # Paths may have been stored on a machine with a different separator
+        file_path = document.file_path.replace('\\', os.sep)
+        if os.path.exists(file_path):
+            with open(file_path, 'rb') as file:
+                document.content_hash = DocumentProcessor.compute_hash(file)
+            hashed += 1
+
+    if hashed:
+        db.session.commit()
+        logger.info(f"Backfilled content hashes for {hashed} documents")
+
+def _backfill_summary_previews(db, batch_size: int = 500):
+    """Store summary previews of documents summarized before the column existed"""
+    from models import Document
+
+    total = 0
+    while True:
+        rows = db.session.query(Document.id, Document.summary).filter(
+            Document.summary_preview.is_(None), Document.summary.isnot(None)
+        ).limit(batch_size).all()
+        if not rows:
+            break
+
+        db.session.execute(
+            update(Document),
+            [{'id': document_id, 'summary_preview': Document.preview(summary)} for document_id, summary in rows]
+        )
+        db.session.commit()
+        total += len(rows)
+
+    if total:
+        logger.info(f"Backfilled summary previews for {total} documents")
+
+def _move_content_to_store(db, batch_size: int = 100):
+    """Move extracted text stored inline in document rows to the content store"""
+    from models import Document
+    from services.content_store import ContentStore
+
+    content_store = ContentStore()
+    total = 0
+    while True:
+        rows = db.session.query(Document.id, Document.content).filter(
+            Document.content.isnot(None), Document.content_key.is_(None)
+        ).limit(batch_size).all()
+        if not rows:
+            break
+
+        db.session.execute(
+            update(Document),
+            [{'id': document_id, 'content_key': content_store.put(content), 'content': None} for document_id, content in rows]
+        )
+        db.session.commit()
+        total += len(rows)
+
+    if total:
+        logger.info(f"Moved the text of {total} documents to the content store; VACUUM the database to reclaim the space")
@@ -1,22 +1,53 @@
 from app import db
 from datetime import datetime
 from sqlalchemy import Text, Integer, String, DateTime, Boolean
+from sqlalchemy.orm import deferred, validates
+
+SUMMARY_PREVIEW_CHARS = 100
 
 class Document(db.Model):
+    __table_args__ = (
+        # Keyset pagination of the document list, newest first
+        db.Index('ix_document_upload_date_id', 'upload_date', 'id'),
+    )
+    
     id = db.Column(Integer, primary_key=True)
     filename = db.Column(String(255), nullable=False)
     original_filename = db.Column(String(255), nullable=False)
     file_path = db.Column(String(500), nullable=False)
     file_type = db.Column(String(10), nullable=False)
     upload_date = db.Column(DateTime, default=datetime.utcnow)
-    summary = db.Column(Text)
-    content = db.Column(Text)
+    # Large text columns are only read from the database when accessed
+    summary = deferred(db.Column(Text))
+    content = deferred(db.Column(Text))  # Legacy inline text, moved to the content store by migrations
+    content_key = db.Column(String(64))  # Key of the extracted text in the ContentStore
+    summary_preview = db.Column(String(SUMMARY_PREVIEW_CHARS + 3))  # Start of the summary, for listings
     processed = db.Column(Boolean, default=False)
+    content_hash = db.Column(String(64), index=True)  # SHA-256 of the uploaded bytes
+    
+    @validates('summary')
+    def _update_summary_preview(self, key, summary):
+        self.summary_preview = self.preview(summary)
+        return summary
+    
+    @staticmethod
+    def preview(summary):
+        """Shortened summary shown in document lists"""
+        if summary and len(summary) > SUMMARY_PREVIEW_CHARS:
+            return summary[:SUMMARY_PREVIEW_CHARS] + '...'
+        return summary
     
     def __repr__(self):
         return f'<Document {self.filename}>'
 
 class Question(db.Model):
+    __table_args__ = (
+        # Question history of a document, newest first, paginated by (created_date, id)
+        db.Index('ix_question_document_id_created_date', 'document_id', 'created_date', 'id'),
+        # Stored answers looked up by the context they were generated from
+        db.Index('ix_question_document_id_context_hash', 'document_id', 'context_hash'),
+    )
+    
     id = db.Column(Integer, primary_key=True)
     document_id = db.Column(Integer, db.ForeignKey('document.id'), nullable=False)
     question_text = db.Column(Text, nullable=False)
@@ -24,6 +55,7 @@ class Question(db.Model):
     answer = db.Column(Text)
     justification = db.Column(Text)
     source_reference = db.Column(Text)
+    context_hash = db.Column(String(64))  # SHA-256 of the retrieved context the answer was generated from
     created_date = db.Column(DateTime, default=datetime.utcnow)
     
     document = db.relationship('Document', backref=db.backref('questions', lazy=True))
@@ -32,6 +64,10 @@ class Question(db.Model):
         return f'<Question {self.id}>'
 
 class ChatSession(db.Model):
+    __table_args__ = (
+        db.Index('ix_chat_session_document_id_created_date', 'document_id', 'created_date'),
+    )
+    
     id = db.Column(Integer, primary_key=True)
     document_id = db.Column(Integer, db.ForeignKey('document.id'), nullable=False)
     session_id = db.Column(String(100), nullable=False)
@@ -41,3 +77,20 @@ class ChatSession(db.Model):
     
     def __repr__(self):
         return f'<ChatSession {self.session_id}>'
+
+class IngestionJob(db.Model):
+    id = db.Column(String(36), primary_key=True)
+    document_id = db.Column(Integer, db.ForeignKey('document.id'), nullable=False)
+    status = db.Column(String(20), nullable=False, default='queued')  # 'queued', 'running', 'completed' or 'failed'
+    stage = db.Column(String(20))  # 'extract', 'summarize' or 'embed' while running
+    stage_timings = db.Column(Text)  # JSON mapping stage -> seconds
+    checkpoint = db.Column(Text)  # JSON partial results, so an interrupted job resumes where it stopped
+    error = db.Column(Text)
+    created_date = db.Column(DateTime, default=datetime.utcnow)
+    started_date = db.Column(DateTime)
+    finished_date = db.Column(DateTime)
+    
+    document = db.relationship('Document', backref=db.backref('ingestion_jobs', lazy=True))
+    
+    def __repr__(self):
+        return f'<IngestionJob {self.id} {self.status}>'
@@ -1,18 +1,29 @@
 import os
+import json
 import uuid
 import logging
-from flask import render_template, request, jsonify, flash, redirect, url_for, session
+from datetime import datetime
+from flask import render_template, request, jsonify, flash, redirect, url_for, session, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from sqlalchemy import insert, tuple_
 from app import app, db
-from models import Document, Question, ChatSession
+from models import Document, Question, ChatSession, IngestionJob
 from services.document_processor import DocumentProcessor
-from services.ai_service import AIService
+from services.ai_service import AIService, DOCUMENT_EXCERPT_CHARS, FALLBACK_CONTEXT_CHARS
 from services.vector_store import VectorStore
+from services.ingestion_service import IngestionService
+from services.model_registry import ModelRegistry
+from services.answer_cache import AnswerCache
+from services.content_store import ContentStore
+from services.inference_scheduler import InferenceScheduler, QueueFullError
 
 # Initialize services
 document_processor = DocumentProcessor()
 ai_service = AIService()
 vector_store = VectorStore()
+content_store = ContentStore()
+ingestion_service = IngestionService(app, document_processor, ai_service, vector_store, content_store)
+answer_cache = AnswerCache(vector_store)
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf'}
 
@@ -24,6 +35,30 @@ def index():
     """Home page"""
     return render_template('index.html')
 
+@app.route('/health')
+def health():
+    """Liveness check that never waits on model loading"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready')
+def ready():
+    """Readiness check reporting model load state and cold-start latency"""
+    status = ModelRegistry.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/api/stats')
+def get_stats():
+    """Runtime cache and performance counters"""
+    return jsonify({
+        'vector_store': vector_store.cache_stats(),
+        'retrieval': vector_store.retrieval_stats(),
+        'query_embedding': vector_store.query_batcher.stats(),
+        'answer_cache': answer_cache.stats(),
+        'llm_streaming': ai_service.stream_stats(),
+        'llm_scheduler': ai_service.scheduler.stats(),
+        'llm_prefix': ai_service.prefix_stats()
+    })
+
 @app.route('/upload', methods=['POST'])
 def upload_document():
     """Handle document upload"""
@@ -38,35 +73,39 @@ def upload_document():
         if not allowed_file(file.filename):
             return jsonify({'error': 'File type not allowed. Please upload PDF or TXT files.'}), 400
         
-        # Save file
         filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
-        
-        # Process document
-        content = document_processor.extract_text(file_path, filename.split('.')[-1])
-        
-        # Create document record
-        document = Document(
-            filename=unique_filename,
-            original_filename=filename,
-            file_path=file_path,
-            file_type=filename.split('.')[-1].lower(),
-            content=content
-        )
-        
+        file_type = filename.split('.')[-1].lower()
+        content_hash = DocumentProcessor.compute_hash(file.stream)
+        
+        # Identical bytes were already processed: reuse the stored file and derived artifacts
+        existing = Document.query.filter_by(content_hash=content_hash, processed=True).first()
+        if existing:
+            document = Document(
+                filename=existing.filename,
+                original_filename=filename,
+                file_path=existing.file_path,
+                file_type=file_type,
+                content_hash=content_hash,
+                content_key=existing.content_key,
+                summary=existing.summary,
+                processed=True
+            )
+        else:
+            # Save file
+            unique_filename = f"{uuid.uuid4()}_{filename}"
+            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+            file.save(file_path)
+            
+            # Create document record; extraction, summary and embeddings run in the background
+            document = Document(
+                filename=unique_filename,
+                original_filename=filename,
+                file_path=file_path,
+                file_type=file_type,
+                content_hash=content_hash
+            )
         db.session.add(document)
-        db.session.commit()
-        
-        # Generate summary
-        summary = ai_service.generate_summary(content)
-        document.summary = summary
-        document.processed = True
-        db.session.commit()
-        
-        # Create vector embeddings
-        vector_store.create_embeddings(document.id, content)
+        db.session.flush()
         
         # Create chat session
         session_id = str(uuid.uuid4())
@@ -75,8 +114,20 @@ def upload_document():
             session_id=session_id
         )
         db.session.add(chat_session)
+        
+        # Create ingestion job
+        job = IngestionJob(id=str(uuid.uuid4()), document_id=document.id, status='queued')
+        if existing:
+            job.status = 'completed'
+            job.started_date = job.finished_date = datetime.utcnow()
+        db.session.add(job)
         db.session.commit()
         
+        if existing:
+            vector_store.share_document(existing.id, document.id)
+        else:
+            ingestion_service.submit(job.id)
+        
         session['current_document_id'] = document.id
         session['current_session_id'] = session_id
         
@@ -84,61 +135,225 @@ def upload_document():
             'success': True,
             'document_id': document.id,
             'session_id': session_id,
-            'summary': summary,
+            'job_id': job.id,
+            'status_url': url_for('get_job_status', job_id=job.id),
+            'deduplicated': existing is not None,
             'filename': filename
-        })
+        }), 202
         
     except Exception as e:
         logging.error(f"Error uploading document: {str(e)}")
         return jsonify({'error': f'Failed to process document: {str(e)}'}), 500
 
+def _resolve_question(data):
+    """Validate a question payload, returning (document, question, error response)"""
+    question = (data.get('question') or '').strip()
+    document_id = data.get('document_id') or session.get('current_document_id')
+    
+    if not question:
+        return None, None, (jsonify({'error': 'Question is required'}), 400)
+    
+    if not document_id:
+        return None, None, (jsonify({'error': 'No document selected'}), 400)
+    
+    document = Document.query.get(document_id)
+    if not document:
+        return None, None, (jsonify({'error': 'Document not found'}), 404)
+    
+    if not document.processed:
+        return None, None, (jsonify({'error': 'Document is still being processed'}), 409)
+    
+    return document, question, None
+
+def _retrieve_context(document, question, bypass_cache):
+    """Retrieve passages for a question and look up a stored answer over the same context"""
+    # Rebuild the document's index if its cache is missing (e.g. written by an older format)
+    if not vector_store.has_document(document.id):
+        if content_store.exists(document.content_key):
+            vector_store.create_embeddings(document.id, content_store.get(document.content_key))
+        else:
+            logging.warning(f"No stored text to index for document {document.id}")
+    
+    # Get relevant context from vector store
+    relevant_chunks = vector_store.search_similar(document.id, question, k=3)
+    context_hash = AnswerCache.context_hash(relevant_chunks)
+    
+    # Reuse a stored answer to the same (or a very similar) question over the same context
+    cached = None
+    if bypass_cache:
+        answer_cache.record_bypass()
+    else:
+        cached = answer_cache.lookup(document.id, question, context_hash)
+    
+    if not cached:
+        return relevant_chunks, context_hash, None, {'hit': False, 'bypassed': bypass_cache}
+    
+    answer_data = {
+        'answer': cached['question'].answer,
+        'justification': cached['question'].justification,
+        'source_reference': cached['question'].source_reference
+    }
+    cache_info = {
+        'hit': True,
+        'match': cached['match'],
+        'similarity': cached['similarity'],
+        'question_id': cached['question'].id
+    }
+    return relevant_chunks, context_hash, answer_data, cache_info
+
+def _save_answer(document, question, answer_data, context_hash):
+    """Save question and answer"""
+    question_record = Question(
+        document_id=document.id,
+        question_text=question,
+        question_type='user',
+        answer=answer_data['answer'],
+        justification=answer_data['justification'],
+        source_reference=answer_data['source_reference'],
+        context_hash=context_hash
+    )
+    
+    db.session.add(question_record)
+    db.session.commit()
+
+def _llm_busy(e):
+    """503 response telling the client to retry once the LLM queue drains"""
+    logging.warning(f"Rejecting request: {str(e)}")
+    response = jsonify({'error': 'The AI model is busy, please try again shortly'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def _sse(event, payload):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def _event_stream(events):
+    """Wrap an event generator in a streaming text/event-stream response"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/ask', methods=['POST'])
 def ask_question():
     """Handle free-form questions"""
     try:
         data = request.json
-        question = data.get('question', '').strip()
-        document_id = data.get('document_id') or session.get('current_document_id')
+        document, question, error = _resolve_question(data)
+        if error:
+            return error
         
-        if not question:
-            return jsonify({'error': 'Question is required'}), 400
+        bypass_cache = bool(data.get('bypass_cache'))
+        relevant_chunks, context_hash, answer_data, cache_info = _retrieve_context(document, question, bypass_cache)
         
-        if not document_id:
-            return jsonify({'error': 'No document selected'}), 400
+        if not answer_data:
+            # Generate answer
+            answer_data = ai_service.answer_question(
+                question, relevant_chunks, content_store.read(document.content_key, 0, FALLBACK_CONTEXT_CHARS)
+            )
+            # A cached answer is already stored as the question it was served from
+            _save_answer(document, question, answer_data, context_hash)
         
-        document = Document.query.get(document_id)
-        if not document:
-            return jsonify({'error': 'Document not found'}), 404
+        return jsonify({
+            'success': True,
+            'answer': answer_data['answer'],
+            'justification': answer_data['justification'],
+            'source_reference': answer_data['source_reference'],
+            'cache': cache_info
+        })
+        
+    except QueueFullError as e:
+        return _llm_busy(e)
+    except Exception as e:
+        logging.error(f"Error answering question: {str(e)}")
+        return jsonify({'error': f'Failed to answer question: {str(e)}'}), 500
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """Answer a free-form question, streaming tokens as server-sent events"""
+    data = request.json
+    document, question, error = _resolve_question(data)
+    if error:
+        return error
+    
+    bypass_cache = bool(data.get('bypass_cache'))
+    
+    # Reject up front while the response status can still be set
+    if not ai_service.scheduler.has_capacity(InferenceScheduler.INTERACTIVE):
+        return _llm_busy(QueueFullError('LLM queue is full'))
+    
+    def generate():
+        try:
+            relevant_chunks, context_hash, answer_data, cache_info = _retrieve_context(document, question, bypass_cache)
+            
+            if answer_data:
+                # A stored answer arrives as a single chunk
+                yield _sse('token', {'text': answer_data['answer']})
+            else:
+                document_opening = content_store.read(document.content_key, 0, FALLBACK_CONTEXT_CHARS)
+                for event in ai_service.stream_answer(question, relevant_chunks, document_opening):
+                    if 'token' in event:
+                        yield _sse('token', {'text': event['token']})
+                    else:
+                        answer_data = event['done']
+                _save_answer(document, question, answer_data, context_hash)
+            
+            yield _sse('done', {
+                'success': True,
+                'answer': answer_data['answer'],
+                'justification': answer_data['justification'],
+                'source_reference': answer_data['source_reference'],
+                'cache': cache_info
+            })
+            
+        except Exception as e:
+            logging.error(f"Error streaming answer: {str(e)}")
+            yield _sse('error', {'error': f'Failed to answer question: {str(e)}'})
+    
+    return _event_stream(generate())
+
+@app.route('/api/search', methods=['POST'])
+def search_library():
+    """Search for relevant passages across every uploaded document"""
+    try:
+        data = request.json
+        query = data.get('query', '').strip()
+        k = min(int(data.get('k', 5)), 50)
         
-        # Get relevant context from vector store
-        relevant_chunks = vector_store.search_similar(document_id, question, k=3)
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
         
-        # Generate answer
-        answer_data = ai_service.answer_question(question, relevant_chunks, document.content)
+        results = vector_store.search_library(query, k=k)
         
-        # Save question and answer
-        question_record = Question(
-            document_id=document_id,
-            question_text=question,
-            question_type='user',
-            answer=answer_data['answer'],
-            justification=answer_data['justification'],
-            source_reference=answer_data['source_reference']
-        )
+        documents = {
+            doc.id: doc
+            for doc in db.session.query(Document.id, Document.original_filename, Document.content_hash).filter(
+                Document.id.in_({r['document_id'] for r in results})
+            )
+        }
         
-        db.session.add(question_record)
-        db.session.commit()
+        # Duplicates indexed before they shared their source's entries would repeat the same passage
+        passages = set()
+        unique_results = []
+        for result in results:
+            doc = documents.get(result['document_id'])
+            if not doc:
+                continue
+            passage = (doc.content_hash or doc.id, result['chunk_id'])
+            if passage in passages:
+                continue
+            passages.add(passage)
+            unique_results.append(dict(result, filename=doc.original_filename))
         
         return jsonify({
             'success': True,
-            'answer': answer_data['answer'],
-            'justification': answer_data['justification'],
-            'source_reference': answer_data['source_reference']
+            'results': unique_results
         })
         
     except Exception as e:
-        logging.error(f"Error answering question: {str(e)}")
-        return jsonify({'error': f'Failed to answer question: {str(e)}'}), 500
+        logging.error(f"Error searching library: {str(e)}")
+        return jsonify({'error': f'Failed to search documents: {str(e)}'}), 500
 
 @app.route('/challenge', methods=['POST'])
 def generate_challenge():
@@ -154,32 +369,40 @@ def generate_challenge():
         if not document:
             return jsonify({'error': 'Document not found'}), 404
         
-        # Generate challenge questions
-        questions = ai_service.generate_challenge_questions(document.content)
-        
-        # Save challenge questions
-        challenge_records = []
-        for q in questions:
-            question_record = Question(
-                document_id=document_id,
-                question_text=q['question'],
-                question_type='challenge',
-                answer=q['expected_answer'],
-                justification=q['justification'],
-                source_reference=q['source_reference']
-            )
-            db.session.add(question_record)
-            challenge_records.append(question_record)
+        if not document.processed:
+            return jsonify({'error': 'Document is still being processed'}), 409
         
-        db.session.commit()
+        # Challenge questions are generated from the document's opening excerpt only
+        questions = ai_service.generate_challenge_questions(
+            content_store.read(document.content_key, 0, DOCUMENT_EXCERPT_CHARS)
+        )
+        
+        # Save challenge questions in one batched insert, getting their IDs back in order
+        question_ids = []
+        if questions:
+            question_ids = db.session.scalars(
+                insert(Question).returning(Question.id, sort_by_parameter_order=True),
+                [
+                    {
+                        'document_id': document.id,
+                        'question_text': q['question'],
+                        'question_type': 'challenge',
+                        'answer': q['expected_answer'],
+                        'justification': q['justification'],
+                        'source_reference': q['source_reference']
+                    }
+                    for q in questions
+                ]
+            ).all()
+            db.session.commit()
         
         # Return questions without answers
         challenge_questions = [
             {
-                'id': q.id,
-                'question': q.question_text
+                'id': question_id,
+                'question': q['question']
             }
-            for q in challenge_records
+            for question_id, q in zip(question_ids, questions)
         ]
         
         return jsonify({
@@ -187,6 +410,8 @@ def generate_challenge():
             'questions': challenge_questions
         })
         
+    except QueueFullError as e:
+        return _llm_busy(e)
     except Exception as e:
         logging.error(f"Error generating challenge: {str(e)}")
         return jsonify({'error': f'Failed to generate challenge: {str(e)}'}), 500
@@ -222,6 +447,8 @@ def evaluate_answer():
             'source_reference': question.source_reference
         })
         
+    except QueueFullError as e:
+        return _llm_busy(e)
     except Exception as e:
         logging.error(f"Error evaluating answer: {str(e)}")
         return jsonify({'error': f'Failed to evaluate answer: {str(e)}'}), 500
@@ -233,37 +460,134 @@ def view_document(document_id):
     session['current_document_id'] = document_id
     return render_template('document_analysis.html', document=document)
 
+def _page_args():
+    """Page size and decoded ?before= cursor of a keyset-paginated listing"""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+    except ValueError:
+        return None, None, (jsonify({'error': 'limit must be an integer'}), 400)
+    
+    before = request.args.get('before')
+    if not before:
+        return limit, None, None
+    
+    try:
+        date, row_id = before.rsplit('_', 1)
+        return limit, (datetime.fromisoformat(date), int(row_id)), None
+    except ValueError:
+        return None, None, (jsonify({'error': 'Invalid cursor'}), 400)
+
+def _page_response(rows, limit, date_of, serialize):
+    """JSON list of the first limit rows, with an X-Next-Cursor header when more rows follow"""
+    response = jsonify([serialize(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        response.headers['X-Next-Cursor'] = f"{date_of(last).isoformat()}_{last.id}"
+    return response
+
 @app.route('/api/documents')
 def get_documents():
-    """Get all uploaded documents"""
-    documents = Document.query.order_by(Document.upload_date.desc()).all()
-    return jsonify([
-        {
-            'id': doc.id,
-            'filename': doc.original_filename,
-            'upload_date': doc.upload_date.isoformat(),
-            'processed': doc.processed,
-            'summary': doc.summary[:100] + '...' if doc.summary and len(doc.summary) > 100 else doc.summary
-        }
-        for doc in documents
-    ])
+    """List uploaded documents, newest first, a page at a time.
+    
+    Pass the X-Next-Cursor header of a response as ?before= to get the next
+    page; it is absent on the last page.
+    """
+    limit, cursor, error = _page_args()
+    if error:
+        return error
+    
+    # Only the listed columns are read, never the document text
+    query = db.session.query(
+        Document.id, Document.original_filename, Document.upload_date, Document.processed, Document.summary_preview
+    )
+    if cursor:
+        query = query.filter(tuple_(Document.upload_date, Document.id) < cursor)
+    
+    documents = query.order_by(Document.upload_date.desc(), Document.id.desc()).limit(limit + 1).all()
+    
+    return _page_response(documents, limit, lambda doc: doc.upload_date, lambda doc: {
+        'id': doc.id,
+        'filename': doc.original_filename,
+        'upload_date': doc.upload_date.isoformat(),
+        'processed': doc.processed,
+        'summary': doc.summary_preview
+    })
+
+@app.route('/api/document/<int:document_id>/summary/stream', methods=['POST'])
+def regenerate_summary_stream(document_id):
+    """Regenerate a document's summary, streaming tokens as server-sent events"""
+    document = Document.query.get_or_404(document_id)
+    if not document.processed:
+        return jsonify({'error': 'Document is still being processed'}), 409
+    
+    if not ai_service.scheduler.has_capacity(InferenceScheduler.INTERACTIVE):
+        return _llm_busy(QueueFullError('LLM queue is full'))
+    
+    def generate():
+        try:
+            # Long documents are summarized section by section; only the final merge streams
+            for event in ingestion_service.summarizer.stream(content_store.get(document.content_key)):
+                if 'token' in event:
+                    yield _sse('token', {'text': event['token']})
+                else:
+                    document.summary = event['done']
+            
+            db.session.commit()
+            yield _sse('done', {'success': True, 'summary': document.summary})
+            
+        except Exception as e:
+            logging.error(f"Error streaming summary: {str(e)}")
+            db.session.rollback()
+            yield _sse('error', {'error': f'Failed to generate summary: {str(e)}'})
+    
+    return _event_stream(generate())
 
 @app.route('/api/document/<int:document_id>/history')
 def get_document_history(document_id):
-    """Get question history for a document"""
-    questions = Question.query.filter_by(document_id=document_id).order_by(Question.created_date.desc()).all()
-    return jsonify([
-        {
-            'id': q.id,
-            'question': q.question_text,
-            'answer': q.answer,
-            'justification': q.justification,
-            'source_reference': q.source_reference,
-            'type': q.question_type,
-            'created_date': q.created_date.isoformat()
-        }
-        for q in questions
-    ])
+    """Get question history for a document, newest first, a page at a time.
+    
+    Paginated like /api/documents: pass X-Next-Cursor back as ?before=.
+    """
+    limit, cursor, error = _page_args()
+    if error:
+        return error
+    
+    # Served by the (document_id, created_date, id) index without sorting
+    query = Question.query.filter(Question.document_id == document_id)
+    if cursor:
+        query = query.filter(tuple_(Question.created_date, Question.id) < cursor)
+    
+    questions = query.order_by(Question.created_date.desc(), Question.id.desc()).limit(limit + 1).all()
+    
+    return _page_response(questions, limit, lambda q: q.created_date, lambda q: {
+        'id': q.id,
+        'question': q.question_text,
+        'answer': q.answer,
+        'justification': q.justification,
+        'source_reference': q.source_reference,
+        'type': q.question_type,
+        'created_date': q.created_date.isoformat()
+    })
+
+@app.route('/api/jobs/<job_id>')
+def get_job_status(job_id):
+    """Get the progress of a background ingestion job"""
+    job = IngestionJob.query.get_or_404(job_id)
+    document = job.document
+    return jsonify({
+        'id': job.id,
+        'document_id': job.document_id,
+        'status': job.status,
+        'stage': job.stage,
+        'stages': list(ingestion_service.stages),
+        'timings': json.loads(job.stage_timings) if job.stage_timings else {},
+        'error': job.error,
+        'processed': document.processed,
+        'summary': document.summary if job.status == 'completed' else None,
+        'created_date': job.created_date.isoformat(),
+        'started_date': job.started_date.isoformat() if job.started_date else None,
+        'finished_date': job.finished_date.isoformat() if job.finished_date else None
+    })
 
 @app.errorhandler(413)
 def too_large(e):
@@ -1,157 +1,219 @@
-import os
 import logging
 import re
-from typing import List, Dict, Any
+import time
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Tuple
 import hashlib
 import random
 
-# Try to import AI libraries, fall back to None if not available
-try:
-    from llama_cpp import Llama
-except ImportError:
-    Llama = None
+from services.model_registry import ModelRegistry
+from services.inference_scheduler import InferenceScheduler, QueueFullError
+from services.prefix_cache import common_prefix_length
+from services.extractive_summarizer import ExtractiveSummarizer
 
-try:
-    from sentence_transformers import SentenceTransformer
-except ImportError:
-    SentenceTransformer = None
+# Characters of the document placed at the start of document-level prompts. Summary
+# and challenge prompts share this excerpt as their prefix so its evaluated state
+# can be reused between them.
+DOCUMENT_EXCERPT_CHARS = 3000
+# Used as the answer context when retrieval finds no passages
+FALLBACK_CONTEXT_CHARS = 2000
 
 class AIService:
     """Service for AI-powered text analysis and question answering"""
     
+    SUMMARY_PARAMS = {
+        'max_tokens': 200,
+        'temperature': 0.1,
+        'top_p': 0.9,
+        'stop': ["Document:", "Summary:", "\n\n"]
+    }
+    
+    ANSWER_PARAMS = {
+        'max_tokens': 300,
+        'temperature': 0.2,
+        'top_p': 0.9,
+        'stop': ["Question:", "Document Content:", "\n\n---"]
+    }
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.llm = None
-        self.embedding_model = None
-        self._initialize_models()
+        # One scheduler slot per pooled LLM context
+        self.scheduler = InferenceScheduler(max_concurrency=ModelRegistry.llm_settings()['contexts'])
+        self.extractive_summarizer = ExtractiveSummarizer()
+        self._stats_lock = threading.Lock()
+        self._stream_stats = {}  # Kind ('answer', 'summary') -> streaming latency counters
+        self._prefix_stats = {}  # Kind -> prompt tokens evaluated vs reused from a cached prefix
     
-    def _initialize_models(self):
-        """Initialize the AI models"""
-        try:
-            # Initialize embedding model (CPU-friendly)
-            if SentenceTransformer:
-                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                self.logger.info("Embedding model initialized successfully")
-            else:
-                self.logger.warning("sentence-transformers not available, using fallback embedding")
-            
-            # Initialize LLM (CPU-friendly)
-            if Llama:
-                model_path = self._get_model_path()
-                if model_path and os.path.exists(model_path):
-                    self.llm = Llama(
-                        model_path=model_path,
-                        n_ctx=4096,  # Context window
-                        n_threads=4,  # Number of CPU threads
-                        verbose=False
-                    )
-                    self.logger.info("LLM initialized successfully")
-                else:
-                    self.logger.warning("LLM model not found. Using fallback responses.")
-            else:
-                self.logger.warning("llama-cpp-python not available, using fallback responses")
-        except Exception as e:
-            self.logger.error(f"Error initializing models: {str(e)}")
-            self.logger.info("Will use fallback responses")
-    
-    def _get_model_path(self) -> str:
-        """Get the path to the LLM model file"""
-        # Check common locations for the model
-        possible_paths = [
-            "models_cache/llama-2-7b-chat.ggmlv3.q4_0.bin",
-            "models_cache/llama-2-7b-chat.q4_0.gguf",
-            "models_cache/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf",
-            os.path.expanduser("~/.cache/huggingface/transformers/llama-2-7b-chat.ggmlv3.q4_0.bin")
-        ]
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                return path
-        
-        return None
+    @property
+    def llm(self):
+        """Shared LLM, loaded on first use"""
+        return ModelRegistry.get_llm()
+    
+    @property
+    def embedding_model(self):
+        """Shared embedding model, loaded on first use"""
+        return ModelRegistry.get_embedding_model()
     
-    def generate_summary(self, text: str, max_words: int = 150) -> str:
+    def generate_summary(self, text: str, max_words: int = 150, priority: int = InferenceScheduler.BACKGROUND) -> str:
         """Generate a concise summary of the document"""
         if not text:
             return "No content to summarize."
         
-        # Truncate text if too long
-        text_preview = text[:3000] if len(text) > 3000 else text
-        
-        prompt = f"""Please provide a concise summary of the following document in no more than {max_words} words. Focus on the main points, key findings, and essential information:
-
-Document:
-{text_preview}
-
-Summary:"""
-        
         if self.llm:
             try:
-                response = self.llm(
-                    prompt,
-                    max_tokens=200,
-                    temperature=0.1,
-                    top_p=0.9,
-                    stop=["Document:", "Summary:", "\n\n"]
-                )
+                with self._llm_slot(priority) as llm:
+                    response = self._complete('summary', llm, self._summary_prompt(text, max_words), self.SUMMARY_PARAMS)
                 summary = response['choices'][0]['text'].strip()
                 return self._limit_words(summary, max_words)
+            except QueueFullError:
+                raise
             except Exception as e:
                 self.logger.error(f"Error generating summary with LLM: {str(e)}")
         
         # Fallback: Extract key sentences
         return self._extractive_summary(text, max_words)
     
-    def answer_question(self, question: str, relevant_chunks: List[str], full_text: str) -> Dict[str, str]:
-        """Answer a question based on document content"""
-        if not question:
-            return {"answer": "No question provided.", "justification": "", "source_reference": ""}
-        
-        context = "\n\n".join(relevant_chunks) if relevant_chunks else full_text[:2000]
+    def stream_summary(self, text: str, max_words: int = 150, priority: int = InferenceScheduler.INTERACTIVE) -> Iterator[Dict[str, Any]]:
+        """Stream a summary as it is generated.
+
+        Yields {'token': text} events as the LLM produces them, then a single
+        {'done': summary} event with the cleaned-up summary.
+        """
+        if not text:
+            yield {'done': "No content to summarize."}
+            return
         
-        prompt = f"""Based on the following document content, answer the question accurately and provide justification.
+        yield from self._stream_summary('summary', self._summary_prompt(text, max_words), text, max_words, priority)
+    
+    def summarize_passage(self, text: str, max_words: int = 80, priority: int = InferenceScheduler.BACKGROUND,
+                          use_llm: bool = True, document: str = None) -> str:
+        """Summarize one section of a longer document (the map step of a full-document summary).
 
-Document Content:
-{context}
+        Pass the whole document with its opening section: that prompt then
+        starts with the document prefix shared with the summary and challenge
+        prompts, so their evaluated state is reused.
+        """
+        if document is not None and document[:DOCUMENT_EXCERPT_CHARS].startswith(text):
+            prompt = self._document_prefix(document) + f"""The excerpt above opens a longer document. Summarize it in no more than {max_words} words, keeping its key facts, findings and figures.
 
-Question: {question}
+Summary:"""
+            return self._summarize_with_fallback('summary_map', prompt, text, max_words, priority, use_llm)
+        
+        prompt = f"""The following passage is one section of a longer document.
 
-Please provide:
-1. A direct answer to the question
-2. Justification explaining why this answer is correct
-3. Reference to the specific part of the document that supports your answer
+Passage:
+{text}
 
-Answer:"""
+Summarize this passage in no more than {max_words} words, keeping its key facts, findings and figures.
+
+Summary:"""
+        return self._summarize_with_fallback('summary_map', prompt, text, max_words, priority, use_llm)
+    
+    def combine_summaries(self, summaries: List[str], max_words: int = 150, priority: int = InferenceScheduler.BACKGROUND,
+                          use_llm: bool = True) -> str:
+        """Merge summaries of consecutive sections into one (the reduce step of a full-document summary)"""
+        prompt = self._combine_prompt(summaries, max_words)
+        return self._summarize_with_fallback('summary_reduce', prompt, "\n".join(summaries), max_words, priority, use_llm)
+    
+    def stream_combined_summary(self, summaries: List[str], max_words: int = 150,
+                                priority: int = InferenceScheduler.INTERACTIVE) -> Iterator[Dict[str, Any]]:
+        """Stream the final merge of section summaries, with the same events as stream_summary"""
+        prompt = self._combine_prompt(summaries, max_words)
+        yield from self._stream_summary('summary', prompt, "\n".join(summaries), max_words, priority)
+    
+    def answer_question(self, question: str, relevant_chunks: List[str], document_opening: str,
+                        priority: int = InferenceScheduler.INTERACTIVE) -> Dict[str, str]:
+        """Answer a question based on document content"""
+        if not question:
+            return {"answer": "No question provided.", "justification": "", "source_reference": ""}
+        
+        prompt, context = self._answer_prompt(question, relevant_chunks, document_opening)
         
         if self.llm:
             try:
-                response = self.llm(
-                    prompt,
-                    max_tokens=300,
-                    temperature=0.2,
-                    top_p=0.9,
-                    stop=["Question:", "Document Content:", "\n\n---"]
-                )
+                with self._llm_slot(priority) as llm:
+                    response = self._complete('answer', llm, prompt, self.ANSWER_PARAMS)
                 response_text = response['choices'][0]['text'].strip()
                 return self._parse_answer_response(response_text, context)
+            except QueueFullError:
+                raise
             except Exception as e:
                 self.logger.error(f"Error answering question with LLM: {str(e)}")
         
         # Fallback: Simple keyword matching
         return self._keyword_based_answer(question, context)
     
-    def generate_challenge_questions(self, text: str) -> List[Dict[str, str]]:
+    def stream_answer(self, question: str, relevant_chunks: List[str], document_opening: str,
+                      priority: int = InferenceScheduler.INTERACTIVE) -> Iterator[Dict[str, Any]]:
+        """Stream an answer as it is generated.
+
+        Yields {'token': text} events as the LLM produces them, then a single
+        {'done': answer_data} event with the parsed answer, justification and
+        source reference.
+        """
+        if not question:
+            yield {'done': {"answer": "No question provided.", "justification": "", "source_reference": ""}}
+            return
+        
+        prompt, context = self._answer_prompt(question, relevant_chunks, document_opening)
+        
+        if self.llm:
+            try:
+                tokens = []
+                for token in self._stream('answer', prompt, self.ANSWER_PARAMS, priority):
+                    tokens.append(token)
+                    yield {'token': token}
+                yield {'done': self._parse_answer_response(''.join(tokens).strip(), context)}
+                return
+            except QueueFullError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error streaming answer with LLM: {str(e)}")
+                if tokens:
+                    # The client already has part of the output; a fallback would be appended to it
+                    raise
+        
+        # Fallback: Simple keyword matching
+        yield {'done': self._keyword_based_answer(question, context)}
+    
+    def prefix_stats(self) -> Dict[str, Any]:
+        """Prompt prefix reuse per kind of call, plus the shared state cache"""
+        prefix_cache = ModelRegistry.get_prefix_cache()
+        with self._stats_lock:
+            calls = {
+                kind: dict(stats, reused_ratio=round(stats['reused_tokens'] / stats['prompt_tokens'], 3) if stats['prompt_tokens'] else None)
+                for kind, stats in self._prefix_stats.items()
+            }
+        return {
+            'calls': calls,
+            'state_cache': prefix_cache.stats() if prefix_cache else None
+        }
+    
+    def stream_stats(self) -> Dict[str, Any]:
+        """Time-to-first-token and generation latency of streamed completions"""
+        with self._stats_lock:
+            return {
+                kind: {
+                    'streams': stats['streams'],
+                    'tokens': stats['tokens'],
+                    'ttft_ms_mean': round(1000 * stats['ttft_seconds'] / stats['streams'], 1),
+                    'ttft_ms_max': round(1000 * stats['ttft_max'], 1),
+                    'ttft_ms_last': round(1000 * stats['ttft_last'], 1),
+                    'total_ms_mean': round(1000 * stats['total_seconds'] / stats['streams'], 1),
+                    'tokens_per_second': round(stats['tokens'] / stats['total_seconds'], 1) if stats['total_seconds'] else None
+                }
+                for kind, stats in self._stream_stats.items()
+            }
+    
+    def generate_challenge_questions(self, text: str, priority: int = InferenceScheduler.NORMAL) -> List[Dict[str, str]]:
         """Generate logic-based challenge questions from the document"""
         if not text:
             return []
         
-        # Use first 2000 characters for question generation
-        text_preview = text[:2000] if len(text) > 2000 else text
+        text_preview = text[:DOCUMENT_EXCERPT_CHARS]
         
-        prompt = f"""Based on the following document, generate exactly 3 challenging questions that test comprehension and logical reasoning. Each question should require understanding and inference from the document content.
-
-Document:
-{text_preview}
+        prompt = self._document_prefix(text) + """Based on the document above, generate exactly 3 challenging questions that test comprehension and logical reasoning. Each question should require understanding and inference from the document content.
 
 For each question, provide:
 1. The question text
@@ -169,22 +231,25 @@ Questions:"""
         
         if self.llm:
             try:
-                response = self.llm(
-                    prompt,
-                    max_tokens=500,
-                    temperature=0.3,
-                    top_p=0.9,
-                    stop=["Document:", "Questions:", "\n\n---"]
-                )
+                with self._llm_slot(priority) as llm:
+                    response = self._complete('challenge', llm, prompt, {
+                        'max_tokens': 500,
+                        'temperature': 0.3,
+                        'top_p': 0.9,
+                        'stop': ["Document:", "Questions:", "\n\n---"]
+                    })
                 response_text = response['choices'][0]['text'].strip()
                 return self._parse_challenge_questions(response_text)
+            except QueueFullError:
+                raise
             except Exception as e:
                 self.logger.error(f"Error generating challenge questions with LLM: {str(e)}")
         
         # Fallback: Generate basic questions
         return self._generate_basic_questions(text_preview)
     
-    def evaluate_answer(self, question: str, user_answer: str, expected_answer: str, justification: str) -> Dict[str, Any]:
+    def evaluate_answer(self, question: str, user_answer: str, expected_answer: str, justification: str,
+                        priority: int = InferenceScheduler.NORMAL) -> Dict[str, Any]:
         """Evaluate user's answer to a challenge question"""
         if not user_answer:
             return {
@@ -212,21 +277,179 @@ Evaluation:"""
         
         if self.llm:
             try:
-                response = self.llm(
-                    prompt,
-                    max_tokens=200,
-                    temperature=0.1,
-                    top_p=0.9,
-                    stop=["Question:", "Evaluation:", "\n\n---"]
-                )
+                with self._llm_slot(priority) as llm:
+                    response = self._complete('evaluate', llm, prompt, {
+                        'max_tokens': 200,
+                        'temperature': 0.1,
+                        'top_p': 0.9,
+                        'stop': ["Question:", "Evaluation:", "\n\n---"]
+                    })
                 response_text = response['choices'][0]['text'].strip()
                 return self._parse_evaluation_response(response_text)
+            except QueueFullError:
+                raise
             except Exception as e:
                 self.logger.error(f"Error evaluating answer with LLM: {str(e)}")
         
         # Fallback: Simple similarity check
         return self._simple_evaluation(user_answer, expected_answer)
     
+    @contextmanager
+    def _llm_slot(self, priority: int):
+        """Wait for a free context in the LLM pool and hold it for the duration of the block"""
+        pool = ModelRegistry.get_llm_pool()
+        # Fewer contexts than configured may have loaded
+        if len(pool) != self.scheduler.max_concurrency:
+            self.scheduler.resize(len(pool))
+        
+        with self.scheduler.slot(priority) as slot:
+            yield pool[slot]
+    
+    def _combine_prompt(self, summaries: List[str], max_words: int) -> str:
+        """Build the prompt merging section summaries into one"""
+        sections = "\n\n".join(f"Section {i + 1}: {summary}" for i, summary in enumerate(summaries))
+        return f"""The following are summaries of consecutive sections of one document, in order.
+
+{sections}
+
+Combine them into a single coherent summary of the whole document in no more than {max_words} words. Focus on the main points, key findings, and essential information.
+
+Summary:"""
+    
+    def _stream_summary(self, kind: str, prompt: str, text: str, max_words: int, priority: int) -> Iterator[Dict[str, Any]]:
+        """Stream a summarization prompt, falling back to extracting sentences from text"""
+        if self.llm:
+            try:
+                tokens = []
+                for token in self._stream(kind, prompt, self.SUMMARY_PARAMS, priority):
+                    tokens.append(token)
+                    yield {'token': token}
+                yield {'done': self._limit_words(''.join(tokens).strip(), max_words)}
+                return
+            except QueueFullError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error streaming {kind} with LLM: {str(e)}")
+                if tokens:
+                    # The client already has part of the output; a fallback would be appended to it
+                    raise
+        
+        # Fallback: Extract key sentences
+        yield {'done': self._extractive_summary(text, max_words)}
+    
+    def _summarize_with_fallback(self, kind: str, prompt: str, text: str, max_words: int, priority: int,
+                                 use_llm: bool) -> str:
+        """Run a summarization prompt, falling back to extracting sentences from text"""
+        if use_llm and self.llm:
+            try:
+                with self._llm_slot(priority) as llm:
+                    response = self._complete(kind, llm, prompt, self.SUMMARY_PARAMS)
+                summary = response['choices'][0]['text'].strip()
+                if summary:
+                    return self._limit_words(summary, max_words)
+            except QueueFullError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error generating {kind} with LLM: {str(e)}")
+        
+        return self._extractive_summary(text, max_words)
+    
+    def _document_prefix(self, text: str) -> str:
+        """Opening of every document-level prompt, identical for the same document"""
+        return f"""The following is an excerpt from a document.
+
+Document:
+{text[:DOCUMENT_EXCERPT_CHARS]}
+
+"""
+    
+    def _summary_prompt(self, text: str, max_words: int) -> str:
+        """Build the summarization prompt"""
+        return self._document_prefix(text) + f"""Please provide a concise summary of the document above in no more than {max_words} words. Focus on the main points, key findings, and essential information.
+
+Summary:"""
+    
+    def _answer_prompt(self, question: str, relevant_chunks: List[str], document_opening: str) -> Tuple[str, str]:
+        """Build the question answering prompt, returning it with the context it uses"""
+        context = "\n\n".join(relevant_chunks) if relevant_chunks else document_opening[:FALLBACK_CONTEXT_CHARS]
+        
+        prompt = f"""Based on the following document content, answer the question accurately and provide justification.
+
+Document Content:
+{context}
+
+Question: {question}
+
+Please provide:
+1. A direct answer to the question
+2. Justification explaining why this answer is correct
+3. Reference to the specific part of the document that supports your answer
+
+Answer:"""
+        return prompt, context
+    
+    def _stream(self, kind: str, prompt: str, params: Dict[str, Any], priority: int) -> Iterator[str]:
+        """Yield completion tokens as llama.cpp produces them, recording latency"""
+        started = time.perf_counter()
+        first_token = None
+        tokens = 0
+        
+        # The slot is held until the stream is exhausted or the client disconnects
+        with self._llm_slot(priority) as llm:
+            self._record_prefix(kind, llm, prompt)
+            for chunk in llm(prompt, stream=True, **params):
+                text = chunk['choices'][0]['text']
+                if not text:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                tokens += 1
+                yield text
+        
+        self._record_stream(kind, first_token, time.perf_counter() - started, tokens)
+    
+    def _complete(self, kind: str, llm, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a blocking completion, recording how much of the prompt was already evaluated"""
+        self._record_prefix(kind, llm, prompt)
+        return llm(prompt, **params)
+    
+    def _record_prefix(self, kind: str, llm, prompt: str):
+        """Count prompt tokens llama.cpp can skip, either still in the context or in the prefix cache"""
+        try:
+            tokens = llm.tokenize(prompt.encode('utf-8'))
+            reused = common_prefix_length(llm.input_ids[:llm.n_tokens].tolist(), tokens)
+            prefix_cache = ModelRegistry.get_prefix_cache()
+            if prefix_cache:
+                reused = max(reused, prefix_cache.longest_prefix(tokens))
+            # The last prompt token is always evaluated to produce logits
+            reused = min(reused, len(tokens) - 1)
+        except Exception as e:
+            self.logger.debug(f"Could not measure prompt prefix reuse: {str(e)}")
+            return
+        
+        self.logger.debug(f"{kind} prompt: reused {reused} of {len(tokens)} tokens")
+        with self._stats_lock:
+            stats = self._prefix_stats.setdefault(kind, {'calls': 0, 'hits': 0, 'prompt_tokens': 0, 'reused_tokens': 0})
+            stats['calls'] += 1
+            stats['hits'] += 1 if reused > 0 else 0
+            stats['prompt_tokens'] += len(tokens)
+            stats['reused_tokens'] += reused
+    
+    def _record_stream(self, kind: str, first_token: float, total: float, tokens: int):
+        with self._stats_lock:
+            stats = self._stream_stats.setdefault(kind, {
+                'streams': 0, 'tokens': 0, 'ttft_seconds': 0.0, 'ttft_max': 0.0,
+                'ttft_last': 0.0, 'total_seconds': 0.0
+            })
+            # A stream that produced nothing counts its whole duration as time to first token
+            first_token = total if first_token is None else first_token
+            stats['streams'] += 1
+            stats['tokens'] += tokens
+            stats['ttft_seconds'] += first_token
+            stats['ttft_max'] = max(stats['ttft_max'], first_token)
+            stats['ttft_last'] = first_token
+            stats['total_seconds'] += total
+    
     def _limit_words(self, text: str, max_words: int) -> str:
         """Limit text to maximum number of words"""
         words = text.split()
@@ -235,23 +458,8 @@ Evaluation:"""
         return ' '.join(words[:max_words]) + '...'
     
     def _extractive_summary(self, text: str, max_words: int) -> str:
-        """Create summary by extracting key sentences"""
-        sentences = re.split(r'[.!?]+', text)
-        # Get first few sentences as summary
-        summary_sentences = []
-        word_count = 0
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence:
-                sentence_words = len(sentence.split())
-                if word_count + sentence_words <= max_words:
-                    summary_sentences.append(sentence)
-                    word_count += sentence_words
-                else:
-                    break
-        
-        return '. '.join(summary_sentences) + '.' if summary_sentences else "Document content available for analysis."
+        """Create summary by extracting the most central sentences"""
+        return self.extractive_summarizer.summarize(text, max_words)
     
     def _parse_answer_response(self, response_text: str, context: str) -> Dict[str, str]:
         """Parse LLM response for answer, justification, and reference"""
@@ -0,0 +1,112 @@
+import os
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional
+from models import Question
+from services.lru_cache import LRUCache
+from services.vector_store import VectorStore
+
+class AnswerCache:
+    """Reuses stored answers for questions already asked against the same retrieved context.
+
+    Candidates are earlier 'user' questions on the document whose context hash
+    matches the passages retrieved for the new question. An exact match on the
+    normalized question wins; otherwise the most similar candidate is used if
+    its embedding cosine similarity reaches ANSWER_CACHE_SIMILARITY.
+    Embeddings come from the vector store, so the question reuses the
+    embedding computed for retrieval and candidates are encoded through the
+    shared query batcher.
+    """
+
+    def __init__(self, vector_store: VectorStore, similarity_threshold: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.vector_store = vector_store
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None else float(os.environ.get('ANSWER_CACHE_SIMILARITY', 0.92))
+        # Question ID -> unit-length embedding of its text
+        self.question_embeddings = LRUCache(8 * 1024 * 1024, lambda embedding: embedding.nbytes)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def context_hash(chunks: List[str]) -> str:
+        """Fingerprint of the context an answer was generated from"""
+        return hashlib.sha256("\n\n".join(chunks).encode('utf-8')).hexdigest()
+
+    def lookup(self, document_id: int, question: str, context_hash: str) -> Optional[Dict[str, Any]]:
+        """Find a stored answer for the question, or None"""
+        candidates = Question.query.filter_by(
+            document_id=document_id,
+            question_type='user',
+            context_hash=context_hash
+        ).order_by(Question.created_date.desc()).limit(200).all()
+
+        normalized = VectorStore.normalize_query(question)
+        match = next((q for q in candidates if VectorStore.normalize_query(q.question_text) == normalized), None)
+        if match:
+            self._count('exact_hits')
+            return {'question': match, 'match': 'exact', 'similarity': 1.0}
+
+        match, similarity = self._most_similar(normalized, candidates)
+        if match and similarity >= self.similarity_threshold:
+            self._count('semantic_hits')
+            return {'question': match, 'match': 'semantic', 'similarity': round(similarity, 4)}
+
+        self._count('misses')
+        return None
+
+    def record_bypass(self):
+        self._count('bypassed')
+
+    def _most_similar(self, normalized: str, candidates: List[Question]):
+        """Candidate with the highest cosine similarity to the question"""
+        if not self.vector_store.embedding_model or not candidates:
+            return None, 0.0
+
+        missing = [q for q in candidates if q.id not in self.question_embeddings]
+        if missing:
+            embeddings = self.vector_store.query_batcher.encode_many(
+                [VectorStore.normalize_query(q.question_text) for q in missing]
+            )
+            for q, embedding in zip(missing, embeddings):
+                self.question_embeddings[q.id] = self._unit(embedding)
+
+        # Usually already cached by the retrieval for this question
+        query = self._unit(self.vector_store.encode_query(normalized)[0])
+        scored = []
+        for q in candidates:
+            embedding = self.question_embeddings.get(q.id)
+            if embedding is not None:
+                scored.append((float(np.dot(query, embedding)), q))
+        if not scored:
+            return None, 0.0
+
+        similarity, match = max(scored, key=lambda item: item[0])
+        return match, similarity
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else None,
+                'similarity_threshold': self.similarity_threshold
+            }
@@ -0,0 +1,198 @@
+import os
+import re
+import math
+import sqlite3
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its of on or she that the their them
+they this to was were what when where which who why will with you your do does did not no can could would
+should how than then there these those been being into about over also such so if any all may might
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric terms without stopwords"""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+class BM25Index:
+    """Persisted inverted index over document chunks with BM25 scoring.
+
+    Postings (term, document, chunk, term frequency) live in a SQLite file
+    indexed by term, so a query only reads the postings of its own terms
+    instead of scanning every chunk. Per-document searches score with the
+    document's own chunk statistics; library-wide searches use global ones.
+    Library-wide searches skip terms found in more than half of all chunks
+    when the query has rarer terms, since reading their long posting lists
+    costs the most and changes the ranking the least.
+    """
+
+    def __init__(self, path: str = "models_cache/bm25.sqlite", k1: float = 1.5, b: float = 0.75):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, document_id INTEGER NOT NULL,
+                                                     chunk INTEGER NOT NULL, tf INTEGER NOT NULL);
+                CREATE INDEX IF NOT EXISTS postings_term ON postings (term, document_id);
+                CREATE INDEX IF NOT EXISTS postings_document ON postings (document_id);
+                CREATE TABLE IF NOT EXISTS chunks (document_id INTEGER NOT NULL, chunk INTEGER NOT NULL,
+                                                   length INTEGER NOT NULL, PRIMARY KEY (document_id, chunk));
+                CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                INSERT OR IGNORE INTO stats VALUES ('chunks', 0), ('length', 0);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection committing on success, so the index is safe to use from any thread"""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add_document(self, document_id: int, texts: List[str]):
+        """Index a document's chunk texts, replacing any previous entries"""
+        term_counts = [Counter(tokenize(text)) for text in texts]
+
+        with self._connect() as connection:
+            self._remove(connection, document_id)
+            connection.executemany(
+                'INSERT INTO postings VALUES (?, ?, ?, ?)',
+                ((term, document_id, chunk, tf) for chunk, counts in enumerate(term_counts) for term, tf in counts.items())
+            )
+            lengths = [sum(counts.values()) for counts in term_counts]
+            connection.executemany(
+                'INSERT INTO chunks VALUES (?, ?, ?)',
+                ((document_id, chunk, length) for chunk, length in enumerate(lengths))
+            )
+            self._update_stats(connection, Counter(term for counts in term_counts for term in counts), len(lengths), sum(lengths))
+
+    def remove_document(self, document_id: int):
+        with self._connect() as connection:
+            self._remove(connection, document_id)
+
+    def has_document(self, document_id: int) -> bool:
+        with self._connect() as connection:
+            return connection.execute('SELECT 1 FROM chunks WHERE document_id = ? LIMIT 1', (document_id,)).fetchone() is not None
+
+    def search_document(self, document_id: int, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Top-k (chunk index, score) of one document, scored with the document's own statistics"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._connect() as connection:
+            chunk_count, total_length = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE document_id = ?', (document_id,)
+            ).fetchone()
+            if not chunk_count:
+                return []
+
+            placeholders = ','.join('?' * len(terms))
+            postings = connection.execute(
+                f'SELECT p.term, p.chunk, p.tf, c.length FROM postings p '
+                f'JOIN chunks c ON c.document_id = p.document_id AND c.chunk = p.chunk '
+                f'WHERE p.term IN ({placeholders}) AND p.document_id = ?',
+                (*terms, document_id)
+            ).fetchall()
+
+        document_frequencies = Counter(term for term, _, _, _ in postings)
+        scores = self._score(
+            ((chunk, term, tf, length) for term, chunk, tf, length in postings),
+            document_frequencies, chunk_count, total_length / chunk_count
+        )
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, int, float]]:
+        """Top-k (document ID, chunk index, score) across the whole library"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._connect() as connection:
+            stats = dict(connection.execute('SELECT key, value FROM stats'))
+            if not stats['chunks']:
+                return []
+
+            placeholders = ','.join('?' * len(terms))
+            document_frequencies = dict(connection.execute(
+                f'SELECT term, df FROM terms WHERE term IN ({placeholders})', tuple(terms)
+            ))
+            useful = [term for term, df in document_frequencies.items() if df <= stats['chunks'] / 2] or list(document_frequencies)
+            if not useful:
+                return []
+
+            placeholders = ','.join('?' * len(useful))
+            postings = connection.execute(
+                f'SELECT p.term, p.document_id, p.chunk, p.tf, c.length FROM postings p '
+                f'JOIN chunks c ON c.document_id = p.document_id AND c.chunk = p.chunk '
+                f'WHERE p.term IN ({placeholders})',
+                tuple(useful)
+            ).fetchall()
+
+        scores = self._score(
+            (((document_id, chunk), term, tf, length) for term, document_id, chunk, tf, length in postings),
+            document_frequencies, stats['chunks'], stats['length'] / stats['chunks']
+        )
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(document_id, chunk, score) for (document_id, chunk), score in ranked]
+
+    def stats(self) -> Dict[str, Any]:
+        """Size of the index"""
+        with self._connect() as connection:
+            stats = dict(connection.execute('SELECT key, value FROM stats'))
+        return {
+            'chunks': stats['chunks'],
+            'mean_chunk_terms': round(stats['length'] / stats['chunks'], 1) if stats['chunks'] else None
+        }
+
+    def _score(self, postings, document_frequencies: Dict[str, int], chunk_count: int, average_length: float) -> Dict[Any, float]:
+        """Sum BM25 term weights per key over (key, term, tf, chunk length) postings"""
+        idf = {term: self._idf(df, chunk_count) for term, df in document_frequencies.items()}
+        scores = Counter()
+        for key, term, tf, length in postings:
+            norm = self.k1 * (1 - self.b + self.b * length / average_length) if average_length else self.k1
+            scores[key] += idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    @staticmethod
+    def _idf(df: int, chunk_count: int) -> float:
+        """BM25 inverse document frequency, kept positive so small documents still rank"""
+        return math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+
+    def _remove(self, connection: sqlite3.Connection, document_id: int):
+        """Delete a document's entries and take them out of the global statistics"""
+        document_frequencies = Counter(dict(connection.execute(
+            'SELECT term, COUNT(*) FROM postings WHERE document_id = ? GROUP BY term', (document_id,)
+        )))
+        chunk_count, length = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks WHERE document_id = ?', (document_id,)
+        ).fetchone()
+        if not chunk_count:
+            return
+
+        connection.execute('DELETE FROM postings WHERE document_id = ?', (document_id,))
+        connection.execute('DELETE FROM chunks WHERE document_id = ?', (document_id,))
+        self._update_stats(connection, Counter({term: -df for term, df in document_frequencies.items()}), -chunk_count, -length)
+        connection.execute('DELETE FROM terms WHERE df <= 0')
+
+    def _update_stats(self, connection: sqlite3.Connection, document_frequencies: Counter, chunk_count: int, length: int):
+        """Add deltas to the per-term document frequencies and global totals"""
+        connection.executemany(
+            'INSERT INTO terms VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df',
+            document_frequencies.items()
+        )
+        connection.execute("UPDATE stats SET value = value + ? WHERE key = 'chunks'", (chunk_count,))
+        connection.execute("UPDATE stats SET value = value + ? WHERE key = 'length'", (length,))
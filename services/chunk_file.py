@@ -0,0 +1,100 @@
+import os
+import mmap
+import struct
+import threading
+import numpy as np
+from typing import List, Dict, Iterator, Optional, Tuple
+
+# Columns of the offset index, one int64 row per chunk
+TEXT_OFFSET, TEXT_LENGTH, START_POS, END_POS, PAGE = range(5)
+
+MAGIC = b'RSK1'
+HEADER = struct.Struct('<4sQ')  # Magic, chunk count
+
+class ChunkFile:
+    """Read-only, list-like view of chunks stored in one file as an offset index plus a UTF-8 blob.
+
+    `<prefix>.data` holds a header, then per chunk the text's byte offset and
+    length plus its start/end positions and page, then the chunk texts back
+    to back. The file is memory-mapped, so opening it is cheap and worker
+    processes share the OS page cache; texts are decoded on access.
+
+    `version` identifies the file that was opened. Every write replaces the
+    file, so comparing it with current_version() tells whether the chunks
+    were rewritten since, by this or any other process.
+    """
+
+    def __init__(self, prefix: str):
+        with open(f"{prefix}.data", 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.version = _file_version(os.fstat(f.fileno()))
+
+        magic, count = HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            raise ValueError(f"{prefix}.data is not a chunk file")
+        self.index = np.frombuffer(self._data, dtype='<i8', count=count * 5, offset=HEADER.size).reshape(count, 5)
+        self._text_start = HEADER.size + self.index.nbytes
+
+    @staticmethod
+    def exists(prefix: str) -> bool:
+        return os.path.exists(f"{prefix}.data")
+
+    @staticmethod
+    def current_version(prefix: str) -> Optional[Tuple[int, int, int]]:
+        """Version of the file now on disk, or None if there is none"""
+        try:
+            return _file_version(os.stat(f"{prefix}.data"))
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def write(prefix: str, chunks: List[Dict]):
+        """Write chunks to disk, replacing any existing file atomically"""
+        texts = [chunk['text'].encode('utf-8') for chunk in chunks]
+        index = np.zeros((len(chunks), 5), dtype='<i8')
+        offset = 0
+
+        for i, (chunk, text) in enumerate(zip(chunks, texts)):
+            index[i] = (offset, len(text), chunk['start_pos'], chunk['end_pos'], chunk.get('page', -1))
+            offset += len(text)
+
+        temporary_path = f"{prefix}.data.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(chunks)))
+            f.write(index.tobytes())
+            f.write(b''.join(texts))
+
+        # One rename swaps index and texts together; readers that already mapped the old file keep a valid view of it
+        os.replace(temporary_path, f"{prefix}.data")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._data)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> Dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        row = self.index[i]
+        offset, length = self._text_start + int(row[TEXT_OFFSET]), int(row[TEXT_LENGTH])
+        chunk = {
+            'id': i,
+            'text': self._data[offset:offset + length].decode('utf-8'),
+            'start_pos': int(row[START_POS]),
+            'end_pos': int(row[END_POS])
+        }
+        if row[PAGE] >= 0:
+            chunk['page'] = int(row[PAGE])
+        return chunk
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+def _file_version(stat: os.stat_result) -> Tuple[int, int, int]:
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
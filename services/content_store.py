@@ -0,0 +1,92 @@
+import os
+import zlib
+import struct
+import hashlib
+import threading
+
+MAGIC = b'RSC1'
+HEADER = struct.Struct('<4sIQI')  # Magic, characters per block, total characters, block count
+
+class ContentStore:
+    """Content-addressed store for extracted document text on local disk.
+
+    Texts are keyed by the SHA-256 of their UTF-8 bytes, so identical documents
+    share one blob. A blob holds the text in blocks of CONTENT_BLOCK_CHARS
+    characters, each compressed separately with zlib, behind a table of
+    block offsets. A range read only decompresses the blocks it overlaps, so
+    the opening of a long document is read without touching the rest.
+    """
+
+    def __init__(self, root: str = "models_cache/content", block_chars: int = None, level: int = 6):
+        self.root = root
+        self.block_chars = block_chars or int(os.environ.get('CONTENT_BLOCK_CHARS', 65536))
+        self.level = level
+
+    def put(self, text: str) -> str:
+        """Store a text and return its key; storing the same text again is a no-op"""
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        path = self._path(key)
+        if os.path.exists(path):
+            return key
+
+        blocks = [
+            zlib.compress(text[start:start + self.block_chars].encode('utf-8'), self.level)
+            for start in range(0, len(text), self.block_chars)
+        ]
+        offsets = [0]
+        for block in blocks:
+            offsets.append(offsets[-1] + len(block))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, self.block_chars, len(text), len(blocks)))
+                f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+                for block in blocks:
+                    f.write(block)
+
+            # Concurrent writers of the same text produce identical files
+            os.replace(temporary_path, path)
+        except Exception:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return key
+
+    def read(self, key: str, start: int = 0, length: int = None) -> str:
+        """Characters [start, start + length) of a stored text, to its end if length is None"""
+        if not key:
+            return ''
+
+        with open(self._path(key), 'rb') as f:
+            magic, block_chars, total, block_count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Content blob {key} is not in a known format")
+
+            end = total if length is None else min(total, start + length)
+            if start >= end:
+                return ''
+
+            offsets = struct.unpack(f'<{block_count + 1}Q', f.read(8 * (block_count + 1)))
+            first, last = start // block_chars, (end - 1) // block_chars
+            f.seek(HEADER.size + 8 * (block_count + 1) + offsets[first])
+            data = f.read(offsets[last + 1] - offsets[first])
+
+        text = ''.join(
+            zlib.decompress(data[offsets[i] - offsets[first]:offsets[i + 1] - offsets[first]]).decode('utf-8')
+            for i in range(first, last + 1)
+        )
+        offset = first * block_chars
+        return text[start - offset:end - offset]
+
+    def get(self, key: str) -> str:
+        """The whole stored text"""
+        return self.read(key)
+
+    def exists(self, key: str) -> bool:
+        return bool(key) and os.path.exists(self._path(key))
+
+    def _path(self, key: str) -> str:
+        # Fan out over subdirectories so no directory grows past a few thousand entries
+        return os.path.join(self.root, key[:2], f"{key}.zblob")
@@ -1,37 +1,78 @@
 import os
+import bisect
+import hashlib
 import logging
+import multiprocessing
 import PyPDF2
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import List, Dict, Iterator, Tuple
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extract pages [start, end) of a PDF; runs in a worker process"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[page_num].extract_text() or "" for page_num in range(start, end)]
 
 class DocumentProcessor:
     """Service for processing and extracting text from documents"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        # PDFs with at least this many pages are extracted on a process pool
+        self.parallel_min_pages = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 50))
+        self.max_workers = int(os.environ.get('PDF_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))
+    
+    @staticmethod
+    def compute_hash(stream, block_size: int = 1024 * 1024) -> str:
+        """SHA-256 of a binary stream, read in blocks; rewinds the stream afterwards"""
+        digest = hashlib.sha256()
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+        stream.seek(0)
+        return digest.hexdigest()
     
-    def extract_text(self, file_path: str, file_type: str) -> str:
-        """Extract text from uploaded document"""
+    def extract_pages(self, file_path: str, file_type: str) -> Iterator[str]:
+        """Yield the text of each page of an uploaded document (TXT files are a single page)"""
         try:
             if file_type.lower() == 'pdf':
-                return self._extract_from_pdf(file_path)
+                yield from self._extract_from_pdf(file_path)
             elif file_type.lower() == 'txt':
-                return self._extract_from_txt(file_path)
+                yield self._extract_from_txt(file_path)
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
         except Exception as e:
             self.logger.error(f"Error extracting text from {file_path}: {str(e)}")
             raise
     
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
-        text = ""
+    def _extract_from_pdf(self, file_path: str) -> Iterator[str]:
+        """Yield page texts of a PDF in order, fanning large files out to worker processes"""
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
-            return text.strip()
+                page_count = len(pdf_reader.pages)
+                
+                if page_count < self.parallel_min_pages or self.max_workers < 2:
+                    for page in pdf_reader.pages:
+                        yield page.extract_text() or ""
+                    return
+            
+            batch_size = -(-page_count // self.max_workers)
+            ranges = [(start, min(start + batch_size, page_count)) for start in range(0, page_count, batch_size)]
+            
+            # Spawned workers start a fresh interpreter instead of forking this one with its models;
+            # main.py and app.py skip the app setup when re-run as the workers' __mp_main__
+            with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context('spawn')) as executor:
+                batches = executor.map(
+                    _extract_page_range,
+                    [file_path] * len(ranges),
+                    [start for start, _ in ranges],
+                    [end for _, end in ranges]
+                )
+                # Each batch is passed on as soon as it and the ones before it are done
+                yield from chain.from_iterable(batches)
+            
+            self.logger.info(f"Extracted {page_count} pages from {file_path} with {len(ranges)} workers")
         except Exception as e:
             self.logger.error(f"Error reading PDF: {str(e)}")
             raise
@@ -45,7 +86,23 @@ class DocumentProcessor:
             self.logger.error(f"Error reading TXT file: {str(e)}")
             raise
     
-    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict]:
+    def join_pages(self, pages: List[str]) -> Tuple[str, List[int]]:
+        """Clean and join page texts, returning the text and the start offset of each page"""
+        parts = []
+        page_offsets = []
+        position = 0
+        
+        for page in pages:
+            page_offsets.append(position)
+            clean_page = self.clean_text(page)
+            if clean_page:
+                parts.append(clean_page)
+                position += len(clean_page) + 1
+        
+        return ' '.join(parts), page_offsets
+    
+    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200,
+                   page_offsets: List[int] = None) -> List[Dict]:
         """Split text into overlapping chunks for better context retrieval"""
         if not text:
             return []
@@ -66,12 +123,16 @@ class DocumentProcessor:
             
             chunk_text = text[start:end].strip()
             if chunk_text:
-                chunks.append({
+                chunk = {
                     'id': chunk_id,
                     'text': chunk_text,
                     'start_pos': start,
                     'end_pos': end
-                })
+                }
+                if page_offsets:
+                    # 1-based page the chunk starts on
+                    chunk['page'] = bisect.bisect_right(page_offsets, start)
+                chunks.append(chunk)
                 chunk_id += 1
             
             start = end - overlap
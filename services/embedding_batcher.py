@@ -0,0 +1,105 @@
+import os
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+class EmbeddingBatcher:
+    """Micro-batches query embeddings from concurrent requests into single model calls.
+
+    Callers block in encode() while a background thread collects the queries
+    that arrive within max_wait_ms of the first one (up to max_batch_size),
+    encodes them in one batch and hands each caller its own row.
+    """
+
+    def __init__(self, get_model: Callable[[], Any], max_batch_size: int = None, max_wait_ms: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.get_model = get_model
+        self.max_batch_size = max_batch_size or int(os.environ.get('EMBEDDING_BATCH_SIZE', 32))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.environ.get('EMBEDDING_BATCH_WAIT_MS', 5))) / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        # Throughput counters
+        self.queries = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, text: str) -> np.ndarray:
+        """Embed one query, returning a (1, dimension) float32 array"""
+        return self._submit(text).result()
+
+    def encode_many(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts, batched together with concurrent queries, returning a (len(texts), dimension) array"""
+        futures = [self._submit(text) for text in texts]
+        return np.vstack([future.result() for future in futures])
+
+    def _submit(self, text: str) -> Future:
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        """Start the batching thread on first use so it is never shared across forked workers"""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            # Gather whatever else arrives before the deadline
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._encode_batch(batch)
+
+    def _encode_batch(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            started = time.perf_counter()
+            embeddings = self.get_model().encode(texts).astype('float32')
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self.queries += len(batch)
+                self.batches += 1
+                self.max_batch_seen = max(self.max_batch_seen, len(batch))
+                self.encode_seconds += elapsed
+
+            for i, (_, future) in enumerate(batch):
+                future.set_result(embeddings[i:i + 1])
+        except Exception as e:
+            self.logger.error(f"Error encoding query batch of {len(batch)}: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching and throughput counters"""
+        with self._lock:
+            return {
+                'queries': self.queries,
+                'batches': self.batches,
+                'mean_batch_size': round(self.queries / self.batches, 2) if self.batches else None,
+                'max_batch_size_seen': self.max_batch_seen,
+                'encode_ms_per_batch': round(1000 * self.encode_seconds / self.batches, 2) if self.batches else None,
+                'encode_ms_per_query': round(1000 * self.encode_seconds / self.queries, 2) if self.queries else None,
+                'queries_per_encode_second': round(self.queries / self.encode_seconds, 1) if self.encode_seconds else None,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000
+            }
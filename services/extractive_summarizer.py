@@ -0,0 +1,149 @@
+import os
+import re
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from services.model_registry import ModelRegistry
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+class ExtractiveSummarizer:
+    """Builds a summary from the document's most central sentences without the LLM.
+
+    Sentences are embedded and ranked with TextRank (PageRank over their cosine
+    similarity matrix), teleporting towards sentences close to the document's
+    centroid. When the document's chunk embeddings from the VectorStore are
+    supplied, the centroid is weighted by the chunks' own TextRank scores and
+    candidate sentences are drawn from the most central chunks first, so only
+    a bounded number of sentences ever needs encoding. The highest scoring
+    sentences that are not near-duplicates of one already picked are returned
+    in document order.
+    """
+
+    def __init__(self, max_sentences: int = None, damping: float = 0.85, redundancy: float = 0.85):
+        self.logger = logging.getLogger(__name__)
+        self.max_sentences = max_sentences or int(os.environ.get('EXTRACTIVE_MAX_SENTENCES', 400))
+        self.damping = damping
+        self.redundancy = redundancy  # Cosine similarity above which a sentence counts as a repeat
+
+    def summarize(self, text: str, max_words: int = 150, chunks: List[Dict] = None,
+                  chunk_embeddings: np.ndarray = None) -> str:
+        """Summarize text, optionally using its already computed chunk embeddings"""
+        model = ModelRegistry.get_embedding_model()
+        chunk_scores = None
+        if chunks and chunk_embeddings is not None and len(chunks) == len(chunk_embeddings):
+            chunk_embeddings = self._unit(chunk_embeddings)
+            chunk_scores = self._pagerank(chunk_embeddings @ chunk_embeddings.T)
+            sentences = self._sentences_from_chunks(chunks, chunk_scores)
+        else:
+            sentences = self._sample(self._split_sentences(text))
+
+        if not sentences:
+            # No punctuated sentences of a usable length: fall back to the opening words
+            text = ' '.join((text or '').split())
+            return self._lead_sentences([text], max_words) if text else "Document content available for analysis."
+
+        if not model or len(sentences) <= 2:
+            return self._lead_sentences(sentences, max_words)
+
+        try:
+            embeddings = self._unit(model.encode(sentences, batch_size=64))
+        except Exception as e:
+            self.logger.error(f"Error embedding sentences for extractive summary: {str(e)}")
+            return self._lead_sentences(sentences, max_words)
+
+        if chunk_scores is not None:
+            centroid = chunk_scores @ chunk_embeddings
+        else:
+            centroid = embeddings.mean(axis=0)
+        prior = np.clip(embeddings @ centroid, 0, None)
+
+        scores = self._pagerank(embeddings @ embeddings.T, prior)
+        return self._select(sentences, embeddings, scores, max_words)
+
+    def _split_sentences(self, text: str) -> List[str]:
+        """Split text into sentences worth extracting, in document order"""
+        sentences = []
+        for sentence in SENTENCE_BOUNDARY.split(text or ''):
+            sentence = ' '.join(sentence.split())
+            if 5 <= len(sentence.split()) <= 80:
+                sentences.append(sentence)
+        return sentences
+
+    def _sample(self, sentences: List[str]) -> List[str]:
+        """Evenly spaced subset of at most max_sentences, so cost stays bounded on long documents"""
+        if len(sentences) <= self.max_sentences:
+            return sentences
+        positions = np.linspace(0, len(sentences) - 1, self.max_sentences).astype(int)
+        return [sentences[i] for i in positions]
+
+    def _sentences_from_chunks(self, chunks: List[Dict], chunk_scores: np.ndarray) -> List[str]:
+        """Candidate sentences from the most central chunks, returned in document order"""
+        candidates: Dict[str, Tuple[int, int]] = {}  # Sentence -> (chunk id, position) of first occurrence
+        for chunk_id in np.argsort(-chunk_scores):
+            for position, sentence in enumerate(self._split_sentences(chunks[chunk_id]['text'])):
+                # Overlapping chunks repeat sentences
+                if sentence not in candidates:
+                    candidates[sentence] = (int(chunk_id), position)
+            if len(candidates) >= self.max_sentences:
+                break
+        return sorted(candidates, key=candidates.get)[:self.max_sentences]
+
+    def _pagerank(self, similarity: np.ndarray, prior: Optional[np.ndarray] = None, iterations: int = 100) -> np.ndarray:
+        """PageRank over a similarity matrix, teleporting according to prior (uniform if None)"""
+        n = len(similarity)
+        weights = np.clip(similarity, 0, None)
+        np.fill_diagonal(weights, 0)
+        row_sums = weights.sum(axis=1, keepdims=True)
+        # Rows without any similar neighbour spread their rank evenly
+        transition = np.where(row_sums > 0, weights / np.where(row_sums > 0, row_sums, 1), 1.0 / n)
+
+        if prior is None or prior.sum() <= 0:
+            prior = np.full(n, 1.0 / n)
+        else:
+            prior = prior / prior.sum()
+
+        rank = prior.copy()
+        for _ in range(iterations):
+            updated = (1 - self.damping) * prior + self.damping * (transition.T @ rank)
+            if np.abs(updated - rank).sum() < 1e-6:
+                return updated
+            rank = updated
+        return rank
+
+    def _select(self, sentences: List[str], embeddings: np.ndarray, scores: np.ndarray, max_words: int) -> str:
+        """Greedily take the best non-redundant sentences that fit the word budget"""
+        picked = []
+        word_count = 0
+        for i in np.argsort(-scores):
+            words = len(sentences[i].split())
+            if word_count + words > max_words:
+                continue
+            if picked and float(np.max(embeddings[picked] @ embeddings[i])) > self.redundancy:
+                continue
+            picked.append(int(i))
+            word_count += words
+
+        if not picked:
+            return self._lead_sentences([sentences[int(np.argmax(scores))]], max_words)
+        return ' '.join(sentences[i] for i in sorted(picked))
+
+    def _lead_sentences(self, sentences: List[str], max_words: int) -> str:
+        """Leading sentences up to the word budget, for when no embedding model is available"""
+        summary = []
+        word_count = 0
+        for sentence in sentences:
+            words = sentence.split()
+            if word_count + len(words) > max_words:
+                if not summary:
+                    summary.append(' '.join(words[:max_words]) + '...')
+                break
+            summary.append(sentence)
+            word_count += len(words)
+        return ' '.join(summary)
+
+    @staticmethod
+    def _unit(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype='float32')
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
@@ -0,0 +1,87 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Sequence
+
+# Damping constant of reciprocal rank fusion; 60 is the value from the original paper
+RRF_K = 60
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K) -> List[Hashable]:
+    """Merge ranked lists by summing 1 / (k + rank) per item, best first.
+
+    Only ranks are used, so rankings with incomparable scores (L2 distances,
+    BM25 scores) can be fused without normalization. Ties keep the order in
+    which items were first seen.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class Reranker:
+    """Reorders retrieval candidates with a cross-encoder within a latency budget.
+
+    Candidates are scored in batches of RERANK_BATCH_SIZE, best fused rank
+    first. Once the time spent so far predicts that the next batch would end
+    past RERANK_BUDGET_MS, scoring stops; the scored candidates are sorted by
+    cross-encoder score and the rest follow in their original order.
+    """
+
+    def __init__(self, get_model: Callable[[], Any], budget_ms: float = None, batch_size: int = None):
+        self.logger = logging.getLogger(__name__)
+        self.get_model = get_model
+        self.budget = (budget_ms if budget_ms is not None else float(os.environ.get('RERANK_BUDGET_MS', 150))) / 1000
+        self.batch_size = batch_size or int(os.environ.get('RERANK_BATCH_SIZE', 8))
+        self._lock = threading.Lock()
+
+        # Reranking counters
+        self.queries = 0
+        self.candidates = 0
+        self.scored = 0
+        self.truncated = 0
+        self.seconds = 0.0
+
+    def rerank(self, query: str, candidates: List[str]) -> List[int]:
+        """Positions of candidates in reranked order, unchanged if no model is configured"""
+        model = self.get_model()
+        if not model or len(candidates) < 2:
+            return list(range(len(candidates)))
+
+        started = time.perf_counter()
+        scores = []
+        try:
+            while len(scores) < len(candidates):
+                batch = candidates[len(scores):len(scores) + self.batch_size]
+                elapsed = time.perf_counter() - started
+                if scores and elapsed + elapsed / len(scores) * len(batch) > self.budget:
+                    break
+                scores.extend(float(score) for score in model.predict([(query, text) for text in batch]))
+        except Exception as e:
+            self.logger.warning(f"Reranking failed, keeping fused order: {e}")
+            scores = []
+
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        order.extend(range(len(scores), len(candidates)))
+        self._record(len(candidates), len(scores), time.perf_counter() - started)
+        return order
+
+    def _record(self, candidates: int, scored: int, seconds: float):
+        with self._lock:
+            self.queries += 1
+            self.candidates += candidates
+            self.scored += scored
+            self.truncated += scored < candidates
+            self.seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Reranked queries, share of candidates scored within the budget and time spent"""
+        with self._lock:
+            return {
+                'budget_ms': round(1000 * self.budget, 1),
+                'queries': self.queries,
+                'truncated': self.truncated,
+                'scored_fraction': round(self.scored / self.candidates, 3) if self.candidates else None,
+                'ms_mean': round(1000 * self.seconds / self.queries, 1) if self.queries else None
+            }
@@ -0,0 +1,120 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+class QueueFullError(Exception):
+    """Raised when too many requests are already waiting for the LLM"""
+
+class InferenceScheduler:
+    """Grants exclusive use of LLM slots to callers in priority order.
+
+    A llama.cpp context is not safe to call from several threads, so every
+    generation must hold a slot. Waiting callers are served by priority
+    (interactive before normal before background), first come first served
+    within a priority. Interactive and normal requests are rejected with
+    QueueFullError once LLM_MAX_QUEUE callers of the same or higher priority
+    are already waiting; background work always queues.
+    """
+
+    INTERACTIVE, NORMAL, BACKGROUND = range(3)
+    PRIORITY_NAMES = ('interactive', 'normal', 'background')
+
+    def __init__(self, max_concurrency: int = 1, max_queue: int = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue or int(os.environ.get('LLM_MAX_QUEUE', 16))
+        self._cond = threading.Condition()
+        self._waiting = []  # Heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._free_slots = list(range(max_concurrency))
+
+        # Queue wait counters per priority
+        self.rejected = 0
+        self._waits = {
+            priority: {'requests': 0, 'wait_seconds': 0.0, 'max_wait': 0.0}
+            for priority in range(len(self.PRIORITY_NAMES))
+        }
+
+    def resize(self, max_concurrency: int):
+        """Change the number of slots, e.g. once the model pool has loaded"""
+        with self._cond:
+            in_use = set(range(self.max_concurrency)) - set(self._free_slots)
+            self.max_concurrency = max_concurrency
+            self._free_slots = [slot for slot in range(max_concurrency) if slot not in in_use]
+            self._cond.notify_all()
+
+    def has_capacity(self, priority: int = NORMAL) -> bool:
+        """Whether a request of this priority would currently be admitted to the queue"""
+        with self._cond:
+            return priority == self.BACKGROUND or self._ahead_of(priority) < self.max_queue
+
+    @contextmanager
+    def slot(self, priority: int = NORMAL) -> Iterator[int]:
+        """Wait for a free slot, hold it for the duration of the block and yield its index"""
+        started = time.perf_counter()
+
+        with self._cond:
+            if priority != self.BACKGROUND and self._ahead_of(priority) >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"LLM queue is full ({self.max_queue} requests waiting)")
+
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while self._waiting[0] != entry or not self._free_slots:
+                    self._cond.wait()
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._waiting)
+            slot = self._free_slots.pop()
+            self._record_wait(priority, time.perf_counter() - started)
+            # The next caller in line may be able to take another free slot
+            self._cond.notify_all()
+
+        try:
+            yield slot
+        finally:
+            with self._cond:
+                # Slots removed by a resize while in use are not handed out again
+                if slot < self.max_concurrency:
+                    self._free_slots.append(slot)
+                self._cond.notify_all()
+
+    def _ahead_of(self, priority: int) -> int:
+        """Number of waiting callers that would be served before a new one of this priority"""
+        return sum(1 for waiting_priority, _ in self._waiting if waiting_priority <= priority)
+
+    def _record_wait(self, priority: int, seconds: float):
+        waits = self._waits[priority]
+        waits['requests'] += 1
+        waits['wait_seconds'] += seconds
+        waits['max_wait'] = max(waits['max_wait'], seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, rejections and queue wait time per priority"""
+        with self._cond:
+            waiting = [priority for priority, _ in self._waiting]
+            return {
+                'slots': self.max_concurrency,
+                'in_flight': max(0, self.max_concurrency - len(self._free_slots)),
+                'max_queue': self.max_queue,
+                'rejected': self.rejected,
+                'priorities': {
+                    name: {
+                        'waiting': waiting.count(priority),
+                        'requests': self._waits[priority]['requests'],
+                        'queue_wait_ms_mean': round(
+                            1000 * self._waits[priority]['wait_seconds'] / self._waits[priority]['requests'], 1
+                        ) if self._waits[priority]['requests'] else None,
+                        'queue_wait_ms_max': round(1000 * self._waits[priority]['max_wait'], 1)
+                    }
+                    for priority, name in enumerate(self.PRIORITY_NAMES)
+                }
+            }
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from app import db
+from models import IngestionJob
+from services.summarizer import MapReduceSummarizer
+
+class IngestionService:
+    """Runs the extract -> summarize -> embed pipeline for uploads on a bounded worker pool"""
+
+    STAGES = ('extract', 'summarize', 'embed')
+
+    def __init__(self, app, document_processor, ai_service, vector_store, content_store, max_workers: int = None,
+                 summary_mode: str = None):
+        self.logger = logging.getLogger(__name__)
+        self.app = app
+        self.document_processor = document_processor
+        self.ai_service = ai_service
+        self.vector_store = vector_store
+        self.content_store = content_store
+        self.summarizer = MapReduceSummarizer(document_processor, ai_service)
+        # 'llm' (map-reduce over the whole document) or 'extractive' (no LLM, for bulk ingestion)
+        self.summary_mode = summary_mode or os.environ.get('SUMMARY_MODE', 'llm')
+        # Extractive summaries reuse the chunk embeddings, so those are computed first
+        self.stages = ('extract', 'embed', 'summarize') if self.summary_mode == 'extractive' else self.STAGES
+        self.max_workers = max_workers or int(os.environ.get('INGESTION_WORKERS', 2))
+        # A job still running after this many seconds is assumed to belong to a dead process
+        self.stale_after = float(os.environ.get('INGESTION_STALE_SECONDS', 3600))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str):
+        """Queue an already persisted ingestion job for background processing"""
+        self._get_executor().submit(self._run_job, job_id)
+        self.logger.info(f"Queued ingestion job {job_id}")
+
+    def resume_interrupted(self, stale_only: bool = False):
+        """Requeue jobs left queued or running by a process that stopped.
+
+        Queued jobs are always submitted; the claim in _run_job keeps a job
+        that another process also submitted from running twice. Every running
+        job is requeued too, so the default must only be used while no job is
+        running, i.e. at startup and from a single process. With stale_only,
+        only jobs that started more than stale_after seconds ago are requeued,
+        which is safe while other processes run jobs. Summaries resume from
+        their checkpoint.
+        """
+        with self.app.app_context():
+            interrupted = IngestionJob.query.filter_by(status='running')
+            if stale_only:
+                interrupted = interrupted.filter(
+                    IngestionJob.started_date < datetime.utcnow() - timedelta(seconds=self.stale_after)
+                )
+            interrupted.update({'status': 'queued'}, synchronize_session=False)
+            db.session.commit()
+            job_ids = [job_id for job_id, in db.session.query(IngestionJob.id).filter_by(status='queued')]
+
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            self.logger.info(f"Resumed {len(job_ids)} interrupted ingestion jobs")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Create the worker pool on first use so it is never shared across forked workers"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='ingestion'
+                )
+            return self._executor
+
+    def _run_job(self, job_id: str):
+        """Run every pipeline stage for a job, recording progress and timings.
+
+        The job and document rows are detached from the session while the
+        stages run, so no transaction or pooled connection is held during
+        extraction, summarization or embedding. Progress updates are short
+        single-row updates; the stages' results are written together with
+        the job's completion in one final transaction.
+        """
+        with self.app.app_context():
+            # Claim the job so it never runs twice, e.g. when also resumed after a restart;
+            # the start of this run is what tells a stale job from one that is still running
+            claimed = IngestionJob.query.filter_by(id=job_id, status='queued').update(
+                {'status': 'running', 'started_date': datetime.utcnow()}
+            )
+            db.session.commit()
+            if not claimed:
+                self.logger.warning(f"Ingestion job {job_id} not found or already claimed")
+                return
+
+            job = db.session.get(IngestionJob, job_id)
+            document = job.document
+            db.session.expunge_all()
+            db.session.close()
+
+            timings = {}
+            state = {}  # Intermediate results handed between stages
+            stage = None
+
+            try:
+                for stage in self.stages:
+                    self._update_job(job_id, stage=stage, stage_timings=json.dumps(timings))
+
+                    started = time.perf_counter()
+                    getattr(self, f'_{stage}')(job, document, state)
+                    timings[stage] = round(time.perf_counter() - started, 3)
+
+                # Single unit of work for the document's results and the job's completion;
+                # re-attaching the document flushes only the columns the stages changed
+                db.session.add(document)
+                document.processed = True
+                IngestionJob.query.filter_by(id=job_id).update({
+                    'status': 'completed',
+                    'stage': None,
+                    'checkpoint': None,
+                    'stage_timings': json.dumps(timings),
+                    'finished_date': datetime.utcnow()
+                })
+                db.session.commit()
+
+                self.logger.info(f"Ingestion job {job_id} completed for document {job.document_id}: {timings}")
+
+            except Exception as e:
+                self.logger.error(f"Ingestion job {job_id} failed during {stage}: {str(e)}")
+                db.session.rollback()
+                self._update_job(job_id, status='failed', error=str(e), stage_timings=json.dumps(timings),
+                                 finished_date=datetime.utcnow())
+
+    def _update_job(self, job_id: str, **values):
+        """Write job progress in its own short transaction"""
+        IngestionJob.query.filter_by(id=job_id).update(values)
+        db.session.commit()
+
+    def _extract(self, job, document, state):
+        """Extract the raw text of the uploaded file page by page"""
+        state['pages'] = list(self.document_processor.extract_pages(document.file_path, document.file_type))
+        state['text'] = "\n".join(state['pages']).strip()
+        document.content_key = self.content_store.put(state['text'])
+
+    def _summarize(self, job, document, state):
+        """Summarize the whole document, checkpointing partial summaries on the job"""
+        if self.summary_mode == 'extractive':
+            document.summary = self.ai_service.extractive_summarizer.summarize(
+                state['text'],
+                chunks=self.vector_store.get_document_chunks(document.id),
+                chunk_embeddings=self.vector_store.get_document_embeddings(document.id)
+            )
+            return
+
+        def save_checkpoint(checkpoint):
+            self._update_job(job.id, checkpoint=json.dumps(checkpoint))
+
+        checkpoint = json.loads(job.checkpoint) if job.checkpoint else None
+        document.summary = self.summarizer.summarize(state['text'], checkpoint, save_checkpoint)
+
+    def _embed(self, job, document, state):
+        """Build the vector index used for question answering"""
+        self.vector_store.create_embeddings(document.id, state['text'], pages=state.get('pages'))
@@ -0,0 +1,243 @@
+import os
+import time
+import logging
+import threading
+
+# Try to import AI libraries, fall back to None if not available
+try:
+    from llama_cpp import Llama
+except ImportError:
+    Llama = None
+
+try:
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+except ImportError:
+    SentenceTransformer = None
+    CrossEncoder = None
+
+from services.prefix_cache import PrefixCache
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# llama.cpp generation stops speeding up much past this many threads per context
+MAX_THREADS_PER_CONTEXT = 8
+
+class ModelRegistry:
+    """Process-wide registry that loads each model once and shares it between services"""
+
+    REQUIRED_MODELS = (f'embedding:{EMBEDDING_MODEL_NAME}', 'llm')
+
+    _models = {}
+    _load_times = {}  # Model key -> seconds spent loading
+    _lock = threading.Lock()
+    _warmup_thread = None
+    _prefix_cache = None  # llama.cpp state cache shared by the LLM pool
+    _started_at = time.monotonic()
+    _ready_at = None
+    logger = logging.getLogger(__name__)
+
+    @classmethod
+    def get_embedding_model(cls, name: str = EMBEDDING_MODEL_NAME):
+        """Get the shared sentence-transformers model, loading it on first use"""
+        return cls._get_or_load(f'embedding:{name}', lambda: cls._load_embedding_model(name))
+
+    @classmethod
+    def get_reranker(cls):
+        """Get the shared cross-encoder named by RERANK_MODEL, or None if reranking is not configured"""
+        name = os.environ.get('RERANK_MODEL')
+        if not name:
+            return None
+        return cls._get_or_load(f'reranker:{name}', lambda: cls._load_reranker(name))
+
+    @classmethod
+    def get_llm(cls):
+        """Get the first llama.cpp context of the pool, loading the pool on first use"""
+        pool = cls.get_llm_pool()
+        return pool[0] if pool else None
+
+    @classmethod
+    def get_llm_pool(cls):
+        """Get the shared pool of llama.cpp contexts, loading it on first use"""
+        return cls._get_or_load('llm', cls._load_llm_pool)
+
+    @classmethod
+    def get_prefix_cache(cls):
+        """Get the prompt prefix state cache attached to the LLM pool, if any"""
+        return cls._prefix_cache
+
+    @staticmethod
+    def llm_settings() -> dict:
+        """Size of the LLM context pool and threads per context.
+
+        The cores available to this process (or LLM_CPU_CORES) are split into
+        LLM_CONTEXTS contexts of LLM_THREADS threads each. Whichever of the two
+        is not set is derived from the other; with neither set, contexts get
+        up to MAX_THREADS_PER_CONTEXT threads each.
+        """
+        cores = int(os.environ.get('LLM_CPU_CORES', 0)) or _available_cores()
+        contexts = int(os.environ.get('LLM_CONTEXTS', 0))
+        threads = int(os.environ.get('LLM_THREADS', 0))
+
+        if not contexts:
+            contexts = max(1, cores // (threads or min(cores, MAX_THREADS_PER_CONTEXT)))
+        if not threads:
+            threads = max(1, cores // contexts)
+
+        return {
+            'cores': cores,
+            'contexts': contexts,
+            'n_threads': threads,
+            'n_ctx': int(os.environ.get('LLM_N_CTX', 4096)),
+            'prefix_cache_mb': int(os.environ.get('LLM_PREFIX_CACHE_MB', 1024))
+        }
+
+    @classmethod
+    def preload(cls):
+        """Load every model up front, e.g. in the gunicorn master before workers fork"""
+        cls.get_embedding_model()
+        cls.get_llm()
+
+    @classmethod
+    def warm_up_async(cls):
+        """Load every model on a background thread so requests are served meanwhile"""
+        with cls._lock:
+            if cls._warmup_thread is None:
+                cls._warmup_thread = threading.Thread(target=cls.preload, name='model-warmup', daemon=True)
+                cls._warmup_thread.start()
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        """Whether every model has finished loading (or failed to, leaving a fallback)"""
+        return cls._ready_at is not None
+
+    @classmethod
+    def status(cls) -> dict:
+        """Report load state and cold-start latency for the readiness endpoint"""
+        return {
+            'ready': cls.is_ready(),
+            'warming_up': bool(cls._warmup_thread and cls._warmup_thread.is_alive()),
+            'uptime_seconds': round(time.monotonic() - cls._started_at, 3),
+            'cold_start_seconds': round(cls._ready_at - cls._started_at, 3) if cls._ready_at else None,
+            'models': {
+                key: {
+                    'available': model is not None,
+                    'load_seconds': cls._load_times.get(key)
+                }
+                for key, model in cls._models.items()
+            },
+            'llm_contexts': len(cls._models.get('llm') or [])
+        }
+
+    @classmethod
+    def _get_or_load(cls, key: str, loader):
+        """Return a cached model, running its loader exactly once per process"""
+        if key in cls._models:
+            return cls._models[key]
+
+        with cls._lock:
+            if key not in cls._models:
+                started = time.perf_counter()
+                # Failed loads are cached as None so services stay in fallback mode
+                cls._models[key] = loader()
+                cls._load_times[key] = round(time.perf_counter() - started, 3)
+
+                if cls._ready_at is None and all(k in cls._models for k in cls.REQUIRED_MODELS):
+                    cls._ready_at = time.monotonic()
+                    cls.logger.info(f"Models ready {cls._ready_at - cls._started_at:.2f}s after process start")
+            return cls._models[key]
+
+    @classmethod
+    def _load_embedding_model(cls, name: str):
+        """Load a sentence-transformers embedding model (CPU-friendly)"""
+        if not SentenceTransformer:
+            cls.logger.warning("sentence-transformers not available, using fallback embedding")
+            return None
+
+        try:
+            model = SentenceTransformer(name)
+            cls.logger.info(f"Embedding model {name} initialized successfully")
+            return model
+        except Exception as e:
+            cls.logger.error(f"Failed to initialize embedding model {name}: {str(e)}")
+            return None
+
+    @classmethod
+    def _load_reranker(cls, name: str):
+        """Load a sentence-transformers cross-encoder (CPU-friendly)"""
+        if not CrossEncoder:
+            cls.logger.warning("sentence-transformers not available, reranking disabled")
+            return None
+
+        try:
+            model = CrossEncoder(name)
+            cls.logger.info(f"Reranker {name} initialized successfully")
+            return model
+        except Exception as e:
+            cls.logger.error(f"Failed to initialize reranker {name}: {str(e)}")
+            return None
+
+    @classmethod
+    def _load_llm_pool(cls):
+        """Load the quantized LLM into a pool of contexts (CPU-friendly)"""
+        if not Llama:
+            cls.logger.warning("llama-cpp-python not available, using fallback responses")
+            return None
+
+        model_path = cls.get_llm_path()
+        if not model_path:
+            cls.logger.warning("LLM model not found. Using fallback responses.")
+            return None
+
+        settings = cls.llm_settings()
+        pool = []
+        for i in range(settings['contexts']):
+            try:
+                # Weights are memory-mapped, so every context shares one copy in the page cache
+                pool.append(Llama(
+                    model_path=model_path,
+                    n_ctx=settings['n_ctx'],  # Context window
+                    n_threads=settings['n_threads'],  # CPU threads per context
+                    use_mmap=True,
+                    verbose=False
+                ))
+            except Exception as e:
+                cls.logger.error(f"Error initializing LLM context {i + 1}/{settings['contexts']}: {str(e)}")
+                break
+
+        if not pool:
+            return None
+
+        if settings['prefix_cache_mb'] > 0:
+            cls._prefix_cache = PrefixCache(settings['prefix_cache_mb'] * 1024 * 1024)
+            for llm in pool:
+                llm.set_cache(cls._prefix_cache)
+
+        cls.logger.info(
+            f"LLM initialized successfully with {len(pool)} context(s) of "
+            f"{settings['n_threads']} threads on {settings['cores']} cores"
+        )
+        return pool
+
+    @staticmethod
+    def get_llm_path() -> str:
+        """Get the path to the LLM model file"""
+        # Check common locations for the model
+        possible_paths = [
+            "models_cache/llama-2-7b-chat.ggmlv3.q4_0.bin",
+            "models_cache/llama-2-7b-chat.q4_0.gguf",
+            "models_cache/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf",
+            os.path.expanduser("~/.cache/huggingface/transformers/llama-2-7b-chat.ggmlv3.q4_0.bin")
+        ]
+
+        for path in possible_paths:
+            if os.path.exists(path):
+                return path
+
+        return None
+
+def _available_cores() -> int:
+    """CPU cores this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
@@ -0,0 +1,72 @@
+import threading
+from typing import Any, Dict, Sequence
+
+try:
+    from llama_cpp import LlamaRAMCache
+except ImportError:
+    LlamaRAMCache = None
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    """Number of leading tokens two sequences share"""
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+class PrefixCache:
+    """Thread-safe llama.cpp state cache shared by every context in the LLM pool.
+
+    After each completion llama.cpp saves the context state keyed by its
+    tokens; a later prompt starting with the same tokens (e.g. the same
+    document excerpt) restores the state with the longest shared prefix and
+    only evaluates the rest. States are interchangeable between contexts of
+    the same model, so one cache serves the whole pool.
+    """
+
+    def __init__(self, capacity_bytes: int):
+        self.capacity_bytes = capacity_bytes
+        self._cache = LlamaRAMCache(capacity_bytes=capacity_bytes)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.saves = 0
+
+    def longest_prefix(self, tokens: Sequence[int]) -> int:
+        """Length of the longest prefix of tokens covered by a cached state"""
+        with self._lock:
+            return max((common_prefix_length(key, tokens) for key in self._cache.cache_state), default=0)
+
+    def __getitem__(self, key: Sequence[int]):
+        with self._lock:
+            self.lookups += 1
+            state = self._cache[key]  # Raises KeyError when nothing shares a prefix
+            self.hits += 1
+            return state
+
+    def __contains__(self, key: Sequence[int]) -> bool:
+        with self._lock:
+            return key in self._cache
+
+    def __setitem__(self, key: Sequence[int], state):
+        with self._lock:
+            self._cache[key] = state
+            self.saves += 1
+
+    @property
+    def cache_size(self) -> int:
+        with self._lock:
+            return self._cache.cache_size
+
+    def stats(self) -> Dict[str, Any]:
+        """State lookups, hits and memory use"""
+        with self._lock:
+            return {
+                'states': len(self._cache.cache_state),
+                'bytes': self._cache.cache_size,
+                'max_bytes': self.capacity_bytes,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'saves': self.saves
+            }
@@ -0,0 +1,131 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List
+from services.inference_scheduler import InferenceScheduler
+
+class MapReduceSummarizer:
+    """Summarizes whole documents that do not fit in the LLM context.
+
+    The text is split into chunks that are summarized in parallel (one task per
+    LLM context), then the chunk summaries are merged in groups of
+    SUMMARY_REDUCE_BATCH, level by level, until one summary is left. Once
+    SUMMARY_TIME_BUDGET seconds have passed, remaining chunks and intermediate
+    merges use extractive summaries so the total LLM time stays bounded; the
+    final merge always uses the LLM. The first chunk's prompt opens with the
+    same document excerpt as the summary and challenge prompts, so they can
+    reuse its evaluated prefix.
+
+    Every finished summary is written to a checkpoint through save_checkpoint,
+    so a document interrupted part way is resumed rather than started over.
+    """
+
+    def __init__(self, document_processor, ai_service, chunk_size: int = None, reduce_batch: int = None,
+                 time_budget: float = None):
+        self.logger = logging.getLogger(__name__)
+        self.document_processor = document_processor
+        self.ai_service = ai_service
+        self.chunk_size = chunk_size or int(os.environ.get('SUMMARY_CHUNK_CHARS', 3000))
+        self.reduce_batch = reduce_batch or int(os.environ.get('SUMMARY_REDUCE_BATCH', 8))
+        self.time_budget = time_budget if time_budget is not None else float(os.environ.get('SUMMARY_TIME_BUDGET', 300))
+
+    def summarize(self, text: str, checkpoint: Dict[str, Any] = None,
+                  save_checkpoint: Callable[[Dict[str, Any]], None] = None, max_words: int = 150,
+                  priority: int = InferenceScheduler.BACKGROUND) -> str:
+        """Summarize the full text, resuming from and updating the checkpoint"""
+        chunks = self._chunks(text)
+        if len(chunks) <= 1:
+            return self.ai_service.generate_summary(text, max_words, priority)
+
+        return self._summarize_levels(text, chunks, checkpoint, save_checkpoint, max_words, priority, final_merge=True)[0]
+
+    def stream(self, text: str, max_words: int = 150, priority: int = InferenceScheduler.INTERACTIVE) -> Iterator[Dict[str, Any]]:
+        """Summarize the full text, streaming the tokens of the final merge.
+
+        Yields the same {'token': ...} / {'done': summary} events as
+        AIService.stream_summary; the chunk summaries are computed first,
+        at the same priority, so a user waiting on the stream is not queued
+        behind background ingestion.
+        """
+        chunks = self._chunks(text)
+        if len(chunks) <= 1:
+            yield from self.ai_service.stream_summary(text, max_words, priority)
+            return
+
+        summaries = self._summarize_levels(text, chunks, None, None, max_words, priority, final_merge=False)
+        if len(summaries) == 1:
+            yield {'done': summaries[0]}
+            return
+        yield from self.ai_service.stream_combined_summary(summaries, max_words, priority)
+
+    def _chunks(self, text: str) -> List[str]:
+        return [chunk['text'] for chunk in self.document_processor.chunk_text(text, self.chunk_size, overlap=0)]
+
+    def _summarize_levels(self, text: str, chunks: List[str], checkpoint: Dict[str, Any],
+                          save_checkpoint: Callable[[Dict[str, Any]], None], max_words: int, priority: int,
+                          final_merge: bool) -> List[str]:
+        """Map the chunks and reduce level by level, stopping before the final merge unless final_merge"""
+        checkpoint = self._validate_checkpoint(checkpoint, len(chunks))
+        save_checkpoint = save_checkpoint or (lambda checkpoint: None)
+        deadline = time.monotonic() + self.time_budget
+
+        # Map: summarize every chunk not already in the checkpoint
+        level = checkpoint['levels'][0]
+        pending = {i: i for i, summary in enumerate(level) if summary is None}
+        if len(pending) < len(chunks):
+            self.logger.info(f"Resuming summary with {len(chunks) - len(pending)}/{len(chunks)} chunks already done")
+        self._run_level(level, pending, deadline, checkpoint, save_checkpoint,
+                        lambda i, use_llm: self.ai_service.summarize_passage(
+                            chunks[i], priority=priority, use_llm=use_llm, document=text if i == 0 else None
+                        ))
+
+        # Reduce: merge groups of summaries until one is left
+        depth = 0
+        while len(level) > 1:
+            groups = [level[i:i + self.reduce_batch] for i in range(0, len(level), self.reduce_batch)]
+            if len(groups) == 1 and not final_merge:
+                break
+            depth += 1
+            if len(checkpoint['levels']) <= depth:
+                checkpoint['levels'].append([None] * len(groups))
+            next_level = checkpoint['levels'][depth]
+
+            pending = {i: group for i, group in enumerate(groups) if next_level[i] is None}
+            final = len(groups) == 1
+            self._run_level(next_level, pending, None if final else deadline, checkpoint, save_checkpoint,
+                            lambda group, use_llm: self.ai_service.combine_summaries(group, max_words, priority, use_llm=use_llm))
+            level = next_level
+
+        return level
+
+    def _run_level(self, results: List[str], pending: Dict[int, Any], deadline: float, checkpoint: Dict[str, Any],
+                   save_checkpoint: Callable[[Dict[str, Any]], None], summarize: Callable[[Any, bool], str]):
+        """Summarize pending inputs in parallel, checkpointing each result as it completes"""
+        if not pending:
+            return
+
+        def task(item):
+            # Work that starts after the deadline is summarized without the LLM
+            use_llm = deadline is None or time.monotonic() < deadline
+            return summarize(item, use_llm)
+
+        workers = max(1, self.ai_service.scheduler.max_concurrency)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='summarize') as executor:
+            futures = {executor.submit(task, item): i for i, item in pending.items()}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                save_checkpoint(checkpoint)
+
+    def _validate_checkpoint(self, checkpoint: Dict[str, Any], chunk_count: int) -> Dict[str, Any]:
+        """Reuse a checkpoint only if it was made for the same chunking"""
+        if (checkpoint and checkpoint.get('chunk_size') == self.chunk_size
+                and checkpoint.get('reduce_batch') == self.reduce_batch
+                and len(checkpoint.get('levels', [[]])[0]) == chunk_count):
+            return checkpoint
+
+        return {
+            'chunk_size': self.chunk_size,
+            'reduce_batch': self.reduce_batch,
+            'levels': [[None] * chunk_count]
+        }
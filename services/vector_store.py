@@ -1,9 +1,19 @@
 import os
-import pickle
+import glob
+import json
+import shutil
 import logging
+import threading
 import numpy as np
-from typing import List, Dict, Any
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple
 from services.document_processor import DocumentProcessor
+from services.model_registry import ModelRegistry
+from services.lru_cache import LRUCache
+from services.chunk_file import ChunkFile
+from services.embedding_batcher import EmbeddingBatcher
+from services.bm25_index import BM25Index
+from services.hybrid_search import Reranker, reciprocal_rank_fusion
 
 # Try to import AI libraries, fall back to None if not available
 try:
@@ -12,205 +22,704 @@ except ImportError:
     faiss = None
 
 try:
-    from sentence_transformers import SentenceTransformer
-except ImportError:
-    SentenceTransformer = None
+    import fcntl
+except ImportError:  # Windows: shard writes are then only serialized within one process
+    fcntl = None
+
+SHARD_DIR = "models_cache/shards"
+
+# Vector IDs encode their chunk as document_id << CHUNK_ID_BITS | chunk index,
+# so the vectors of one document form a contiguous ID range
+CHUNK_ID_BITS = 20
+
+# 'dense' is FAISS only, 'keyword' BM25 only, 'hybrid' fuses both and 'rerank'
+# additionally reorders the fused candidates with a cross-encoder
+RETRIEVAL_MODES = ('dense', 'keyword', 'hybrid', 'rerank')
 
 class VectorStore:
-    """Vector store for document similarity search"""
-    
+    """Vector store for document similarity search.
+
+    Chunk vectors of every document live in a library-wide index split into
+    shards of consecutive document IDs. Per-document search restricts a shard
+    search to the document's ID range; library-wide search merges all shards.
+    Shards switch from exact (flat) search to an ANN index once they grow past
+    VECTOR_ANN_THRESHOLD vectors. The shard index is the only copy of the
+    vectors; a document's embedding matrix is reconstructed from it on demand.
+
+    Shards are shared by every worker process through their files. A write
+    copies the shard under an exclusive file lock, modifies the copy, replaces
+    the file atomically and only then swaps the copy into this process's
+    cache, so searches never wait for writes and never see a half-modified
+    index. A cached shard is reloaded once another process replaced its file.
+    Each worker deserializes the shards it searches into its own memory; the
+    shard cache bounds that copy, and a private copy is what lets a write
+    swap in a new index without disturbing concurrent searches.
+
+    A document uploaded again with identical content is indexed only once:
+    the duplicate records its source and every lookup for it is served from
+    the source's chunks, vectors and keyword postings. Deleting the source
+    hands them over to its first duplicate, which the others then share.
+
+    Chunks are also indexed in a BM25 inverted index. Per-document search
+    runs in RETRIEVAL_MODE: by default the dense and BM25 rankings of the top
+    HYBRID_CANDIDATES chunks are fused with reciprocal rank fusion. BM25 alone
+    is used when the embedding model or FAISS is unavailable.
+    """
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.embedding_model = None
-        if SentenceTransformer:
-            try:
-                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                self.logger.info("Embedding model initialized successfully")
-            except Exception as e:
-                self.logger.warning(f"Failed to initialize embedding model: {e}")
-        else:
-            self.logger.warning("SentenceTransformer not available, using fallback search")
-        
         self.document_processor = DocumentProcessor()
-        self.indices = {}  # Document ID -> FAISS index
-        self.chunks = {}   # Document ID -> List of chunks
-        self.embeddings = {}  # Document ID -> embeddings
-        
-    def create_embeddings(self, document_id: int, text: str):
-        """Create embeddings for a document"""
+        self.docs_per_shard = int(os.environ.get('VECTOR_DOCS_PER_SHARD', 256))
+        self.ann_threshold = int(os.environ.get('VECTOR_ANN_THRESHOLD', 50000))
+        self.ann_type = os.environ.get('VECTOR_ANN_TYPE', 'hnsw').lower()  # 'hnsw' or 'ivf'
+        self.ivf_nprobe = int(os.environ.get('VECTOR_IVF_NPROBE', 16))
+        self.hnsw_ef_search = int(os.environ.get('VECTOR_HNSW_EF_SEARCH', 64))
+
+        # Loaded state is kept in LRU caches bounded by bytes so worker memory stays flat
+        megabyte = 1024 * 1024
+        self.shards = LRUCache(  # Shard ID -> {'index': FAISS index, 'kind': str, 'documents': {document ID: vector count}, 'version': file identity}
+            int(os.environ.get('VECTOR_SHARD_CACHE_MB', 256)) * megabyte, self._shard_size
+        )
+        self.chunks = LRUCache(  # Document ID -> List of chunks
+            int(os.environ.get('VECTOR_CHUNK_CACHE_MB', 64)) * megabyte, self._chunks_size
+        )
+        self.query_embeddings = LRUCache(  # Normalized query -> query embedding
+            int(os.environ.get('QUERY_EMBEDDING_CACHE_MB', 16)) * megabyte, lambda embedding: embedding.nbytes
+        )
+        self.retrievals = LRUCache(  # (document ID, chunk file version, normalized query, k, mode) -> chunk indices
+            int(os.environ.get('RETRIEVAL_CACHE_MB', 8)) * megabyte, lambda chunk_indices: 64 + 8 * len(chunk_indices)
+        )
+        # Serializes shard writes within this process; the shard's lock file does so across processes
+        self._write_lock = threading.Lock()
+
+        # Query embeddings from concurrent requests are encoded together
+        self.query_batcher = EmbeddingBatcher(ModelRegistry.get_embedding_model)
+
+        self.keyword_index = BM25Index("models_cache/bm25.sqlite")
+
+        self.retrieval_mode = os.environ.get('RETRIEVAL_MODE', 'hybrid').lower()
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            self.logger.warning(f"Unknown RETRIEVAL_MODE {self.retrieval_mode!r}, using hybrid")
+            self.retrieval_mode = 'hybrid'
+        self.hybrid_candidates = int(os.environ.get('HYBRID_CANDIDATES', 20))
+        self.reranker = Reranker(ModelRegistry.get_reranker)
+
+    @property
+    def embedding_model(self):
+        """Shared embedding model, loaded on first use"""
+        return ModelRegistry.get_embedding_model()
+
+    def create_embeddings(self, document_id: int, text: str, pages: List[str] = None):
+        """Create embeddings for a document, tagging chunks with their page when pages are given"""
         try:
             # Clean and chunk the text
-            clean_text = self.document_processor.clean_text(text)
-            chunks = self.document_processor.chunk_text(clean_text)
-            
+            if pages:
+                clean_text, page_offsets = self.document_processor.join_pages(pages)
+            else:
+                clean_text, page_offsets = self.document_processor.clean_text(text), None
+            chunks = self.document_processor.chunk_text(clean_text, page_offsets=page_offsets)
+
             if not chunks:
                 self.logger.warning(f"No chunks created for document {document_id}")
                 return
-            
-            # Store chunks (with or without embeddings)
-            self.chunks[document_id] = chunks
-            
+
+            # A duplicate indexed in its own right no longer uses its source's entries
+            self._remove_source(document_id)
+
+            chunk_texts = [chunk['text'] for chunk in chunks]
+            self.keyword_index.add_document(document_id, chunk_texts)
+
             if self.embedding_model and faiss:
-                # Create embeddings for chunks
-                chunk_texts = [chunk['text'] for chunk in chunks]
-                embeddings = self.embedding_model.encode(chunk_texts)
-                
-                # Create FAISS index
-                dimension = embeddings.shape[1]
-                index = faiss.IndexFlatL2(dimension)
-                index.add(embeddings.astype('float32'))
-                
-                # Store everything
-                self.indices[document_id] = index
-                self.embeddings[document_id] = embeddings
-                
-                # Save to disk
-                self._save_to_disk(document_id)
-                
-                self.logger.info(f"Created embeddings for document {document_id} with {len(chunks)} chunks")
+                try:
+                    # Create embeddings for chunks; the vectors live only in the library-wide index
+                    embeddings = self.embedding_model.encode(chunk_texts).astype('float32')
+                    self._add_to_index(document_id, embeddings)
+
+                    self.logger.info(f"Created embeddings for document {document_id} with {len(chunks)} chunks")
+                except Exception as e:
+                    # Don't raise in fallback mode, the chunks are still stored below
+                    self.logger.error(f"Error creating embeddings for document {document_id}: {str(e)}")
             else:
                 self.logger.info(f"Stored {len(chunks)} chunks for document {document_id} (fallback mode)")
-            
+
+            # Store chunks last: their new file version is what makes every worker's
+            # cached retrievals for the document stop matching
+            self._save_to_disk(document_id, chunks)
+            if self._load_chunks(document_id) is None:
+                self.chunks[document_id] = chunks
+
         except Exception as e:
             self.logger.error(f"Error creating embeddings for document {document_id}: {str(e)}")
             # Don't raise in fallback mode, just store chunks
             self.chunks[document_id] = chunks if 'chunks' in locals() else []
-    
-    def search_similar(self, document_id: int, query: str, k: int = 5) -> List[str]:
-        """Search for similar chunks in the document"""
+
+    def search_similar(self, document_id: int, query: str, k: int = 5, mode: str = None) -> List[str]:
+        """Search for similar chunks in the document, in RETRIEVAL_MODE unless a mode is given"""
         try:
-            # Load from disk if not in memory
-            if document_id not in self.chunks and document_id not in self.indices:
-                self._load_from_disk(document_id)
-            
-            chunks = self.chunks.get(document_id, [])
+            document_id = self._canonical_id(document_id)
+            chunks = self.get_document_chunks(document_id)
             if not chunks:
                 self.logger.warning(f"No chunks found for document {document_id}")
                 return []
-            
+
             # If we have embeddings and FAISS, use semantic search
-            if document_id in self.indices and self.embedding_model:
+            if self.embedding_model and faiss and self._is_indexed(document_id):
                 try:
-                    # Encode query
-                    query_embedding = self.embedding_model.encode([query])
-                    
-                    # Search in FAISS index
-                    index = self.indices[document_id]
-                    
                     # Ensure k doesn't exceed number of chunks
                     k = min(k, len(chunks))
-                    
-                    distances, indices = index.search(query_embedding.astype('float32'), k)
-                    
+
+                    mode = mode or self.retrieval_mode
+                    normalized = self.normalize_query(query)
+                    cache_key = (document_id, getattr(chunks, 'version', None), normalized, k, mode)
+                    chunk_indices = self.retrievals.get(cache_key)
+
+                    if chunk_indices is None:
+                        chunk_indices = self._retrieve(document_id, chunks, normalized, k, mode)
+                        self.retrievals[cache_key] = chunk_indices
+
                     # Return the text of similar chunks
-                    similar_chunks = []
-                    for idx in indices[0]:
-                        if idx < len(chunks):
-                            similar_chunks.append(chunks[idx]['text'])
-                    
-                    return similar_chunks
+                    return [chunks[idx]['text'] for idx in chunk_indices if idx < len(chunks)]
                 except Exception as e:
                     self.logger.warning(f"Semantic search failed, falling back to keyword search: {e}")
-            
-            # Fallback: simple keyword-based search
-            return self._keyword_search(chunks, query, k)
-            
+
+            # Fallback: BM25 keyword search
+            return self._keyword_search(document_id, chunks, query, k)
+
         except Exception as e:
             self.logger.error(f"Error searching similar chunks for document {document_id}: {str(e)}")
             return []
-    
-    def _keyword_search(self, chunks: List[Dict], query: str, k: int = 5) -> List[str]:
-        """Fallback keyword-based search"""
-        query_words = set(query.lower().split())
-        scored_chunks = []
-        
-        for chunk in chunks:
-            chunk_text = chunk['text'].lower()
-            chunk_words = set(chunk_text.split())
-            
-            # Calculate simple word overlap score
-            overlap = len(query_words.intersection(chunk_words))
-            if overlap > 0:
-                # Bonus for exact phrase matches
-                if query.lower() in chunk_text:
-                    overlap += 10
-                scored_chunks.append((overlap, chunk['text']))
-        
-        # Sort by score (descending) and return top k
-        scored_chunks.sort(key=lambda x: x[0], reverse=True)
-        return [chunk for _, chunk in scored_chunks[:k]]
-    
+
+    def search_library(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Search for similar chunks across every indexed document"""
+        if not (self.embedding_model and faiss):
+            return self._keyword_search_library(query, k)
+
+        try:
+            query_embedding = self.encode_query(self.normalize_query(query))
+
+            hits = []
+            for shard_id in self._shard_ids():
+                shard = self._get_shard(shard_id)
+                if not shard or shard['index'].ntotal == 0:
+                    continue
+                distances, ids = self._search_index(shard, query_embedding, min(k, shard['index'].ntotal))
+                hits.extend((float(d), int(i)) for d, i in zip(distances[0], ids[0]) if i != -1)
+
+            # Merge the per-shard top-k lists
+            hits.sort(key=lambda hit: hit[0])
+
+            results = []
+            for distance, vector_id in hits[:k]:
+                document_id, chunk_index = self._decode_vector_id(vector_id)
+                chunks = self.get_document_chunks(document_id)
+                if chunk_index >= len(chunks):
+                    continue
+                chunk = chunks[chunk_index]
+                results.append({
+                    'document_id': document_id,
+                    'chunk_id': chunk['id'],
+                    'text': chunk['text'],
+                    'page': chunk.get('page'),
+                    'distance': distance
+                })
+            return results
+
+        except Exception as e:
+            self.logger.error(f"Error searching library: {str(e)}")
+            return []
+
+    def _retrieve(self, document_id: int, chunks: List[Dict], normalized_query: str, k: int, mode: str) -> List[int]:
+        """Top-k chunk indices of one document in the given retrieval mode"""
+        if mode == 'keyword':
+            return self._keyword_ranking(document_id, chunks, normalized_query, k)
+
+        query_embedding = self.encode_query(normalized_query)
+        if mode == 'dense':
+            return self._search_document(document_id, query_embedding, k)
+
+        # Fuse a wider pool of dense and keyword candidates than will be returned
+        candidates = min(max(k, self.hybrid_candidates), len(chunks))
+        fused = reciprocal_rank_fusion([
+            self._search_document(document_id, query_embedding, candidates),
+            self._keyword_ranking(document_id, chunks, normalized_query, candidates)
+        ])[:candidates]
+
+        if mode == 'rerank':
+            order = self.reranker.rerank(normalized_query, [chunks[i]['text'] for i in fused])
+            fused = [fused[i] for i in order]
+        return fused[:k]
+
+    def _keyword_ranking(self, document_id: int, chunks: List[Dict], query: str, k: int) -> List[int]:
+        """Top-k chunk indices of one document by BM25"""
+        if not self.keyword_index.has_document(document_id):
+            # Documents chunked before the keyword index existed are indexed on first use
+            self.keyword_index.add_document(document_id, [chunk['text'] for chunk in chunks])
+
+        hits = self.keyword_index.search_document(document_id, query, k)
+        return [chunk_index for chunk_index, _ in hits if chunk_index < len(chunks)]
+
+    def _keyword_search(self, document_id: int, chunks: List[Dict], query: str, k: int = 5) -> List[str]:
+        """Fallback BM25 keyword search within one document"""
+        return [chunks[chunk_index]['text'] for chunk_index in self._keyword_ranking(document_id, chunks, query, k)]
+
+    def _keyword_search_library(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Fallback BM25 keyword search across every document"""
+        try:
+            results = []
+            for document_id, chunk_index, score in self.keyword_index.search(query, k):
+                chunks = self.get_document_chunks(document_id)
+                if chunk_index >= len(chunks):
+                    continue
+                chunk = chunks[chunk_index]
+                results.append({
+                    'document_id': document_id,
+                    'chunk_id': chunk['id'],
+                    'text': chunk['text'],
+                    'page': chunk.get('page'),
+                    'score': score
+                })
+            return results
+
+        except Exception as e:
+            self.logger.error(f"Error searching library by keyword: {str(e)}")
+            return []
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Case- and whitespace-insensitive form of a question, used as the cache key"""
+        return ' '.join(query.lower().split()).rstrip('?!. ')
+
+    def encode_query(self, normalized_query: str) -> np.ndarray:
+        """Embed a normalized query, reusing the cached embedding when available"""
+        query_embedding = self.query_embeddings.get(normalized_query)
+        if query_embedding is None:
+            query_embedding = self.query_batcher.encode(normalized_query)
+            self.query_embeddings[normalized_query] = query_embedding
+        return query_embedding
+
+    def get_document_embeddings(self, document_id: int):
+        """Reconstruct a document's chunk embedding matrix from its shard, or None if not indexed"""
+        if not faiss:
+            return None
+
+        document_id = self._canonical_id(document_id)
+        shard = self._get_shard(self._shard_id(document_id))
+        if not shard or document_id not in shard['documents']:
+            return None
+        return self._reconstruct(shard, document_id)
+
+    def _reconstruct(self, shard: Dict, document_id: int) -> np.ndarray:
+        """Read a document's vectors back out of a shard index"""
+        start, _ = self._id_range(document_id)
+        count = shard['documents'][document_id]
+        ids = np.arange(start, start + count, dtype='int64')
+        return shard['index'].reconstruct_batch(ids).astype('float32')
+
     def get_document_chunks(self, document_id: int) -> List[Dict]:
-        """Get all chunks for a document"""
-        if document_id not in self.chunks:
-            self._load_from_disk(document_id)
-        
-        return self.chunks.get(document_id, [])
-    
-    def _save_to_disk(self, document_id: int):
-        """Save document embeddings to disk"""
+        """Get all chunks for a document, loading them from disk if needed"""
+        document_id = self._canonical_id(document_id)
+        chunks = self.chunks.get(document_id)
+        if isinstance(chunks, ChunkFile) and chunks.version != ChunkFile.current_version(self._chunks_prefix(document_id)):
+            # Rewritten (or deleted) by another worker since it was opened
+            chunks = None
+        if chunks is None:
+            chunks = self._load_chunks(document_id)
+        return chunks or []
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and memory use of the in-memory caches"""
+        return {
+            'shards': self.shards.stats(),
+            'chunks': self.chunks.stats(),
+            'query_embeddings': self.query_embeddings.stats(),
+            'retrievals': self.retrievals.stats(),
+            'keyword_index': self.keyword_index.stats()
+        }
+
+    def retrieval_stats(self) -> Dict[str, Any]:
+        """Retrieval mode and reranker counters"""
+        return {
+            'mode': self.retrieval_mode,
+            'hybrid_candidates': self.hybrid_candidates,
+            'reranker': self.reranker.stats()
+        }
+
+    @staticmethod
+    def _chunks_size(chunks) -> int:
+        """Approximate memory footprint of a chunk list or chunk file"""
+        if isinstance(chunks, ChunkFile):
+            return chunks.nbytes
+        return sum(len(chunk['text']) + 200 for chunk in chunks)
+
+    @staticmethod
+    def _shard_size(shard: Dict) -> int:
+        """Approximate memory footprint of a shard's index"""
+        index = shard['index']
+        size = index.ntotal * index.d * 4 + index.ntotal * 8  # float32 vectors plus int64 IDs
+        if shard['kind'] == 'hnsw':
+            size += index.ntotal * 32 * 2 * 4  # Graph links for M=32
+        return size
+
+    def _shard_id(self, document_id: int) -> int:
+        """Shard holding a document's vectors"""
+        return document_id // self.docs_per_shard
+
+    def _id_range(self, document_id: int) -> Tuple[int, int]:
+        """Half-open vector ID range of a document's chunks"""
+        return document_id << CHUNK_ID_BITS, (document_id + 1) << CHUNK_ID_BITS
+
+    def _decode_vector_id(self, vector_id: int) -> Tuple[int, int]:
+        """Split a vector ID into (document ID, chunk index)"""
+        return vector_id >> CHUNK_ID_BITS, vector_id & ((1 << CHUNK_ID_BITS) - 1)
+
+    def _is_indexed(self, document_id: int) -> bool:
+        """Whether a document's vectors are in its shard"""
+        shard = self._get_shard(self._shard_id(document_id))
+        return bool(shard and document_id in shard['documents'])
+
+    def _add_to_index(self, document_id: int, embeddings: np.ndarray):
+        """Add (or replace) a document's vectors in its shard"""
+        shard_id = self._shard_id(document_id)
+        with self._locked_shard(shard_id):
+            shard = self._writable_shard(shard_id)
+            if shard is None:
+                shard = {'index': self._new_index('flat', embeddings.shape[1]), 'kind': 'flat', 'documents': {}, 'version': None}
+
+            if document_id in shard['documents']:
+                self._remove_from_shard(shard_id, shard, document_id)
+
+            start, _ = self._id_range(document_id)
+            ids = np.arange(start, start + len(embeddings), dtype='int64')
+
+            if shard['kind'] == 'flat' and shard['index'].ntotal + len(embeddings) >= self.ann_threshold:
+                # Shard has outgrown exact search: rebuild it as an ANN index
+                self._build_shard(shard_id, shard, self.ann_type, (embeddings, ids))
+            else:
+                shard['index'].add_with_ids(embeddings, ids)
+            shard['documents'][document_id] = len(embeddings)
+
+            self._save_shard(shard_id, shard)
+            # Searches already running keep the index they started with
+            self.shards[shard_id] = shard
+
+    def _remove_from_shard(self, shard_id: int, shard: Dict, document_id: int):
+        """Drop a document's vectors from a shard, then its entry in the shard's metadata"""
+        if shard['kind'] == 'hnsw':
+            # HNSW graphs do not support removal, rebuild from the remaining documents
+            self._build_shard(shard_id, shard, 'hnsw', exclude=document_id)
+        elif shard['kind'] == 'ivf':
+            # The IVF direct map is a hashtable, which only removes an explicit list of IDs
+            start, _ = self._id_range(document_id)
+            ids = np.arange(start, start + shard['documents'][document_id], dtype='int64')
+            shard['index'].remove_ids(faiss.IDSelectorArray(ids))
+        else:
+            shard['index'].remove_ids(faiss.IDSelectorRange(*self._id_range(document_id)))
+
+        shard['documents'].pop(document_id)
+
+    def _build_shard(self, shard_id: int, shard: Dict, kind: str, extra: Tuple[np.ndarray, np.ndarray] = None,
+                     exclude: int = None):
+        """Rebuild a shard's index from the vectors of its current documents (except exclude) plus optional (vectors, ids)"""
+        vectors = []
+        ids = []
+
+        for document_id, count in sorted(shard['documents'].items()):
+            if document_id == exclude:
+                continue
+            start, _ = self._id_range(document_id)
+            vectors.append(self._reconstruct(shard, document_id))
+            ids.append(np.arange(start, start + count, dtype='int64'))
+
+        if extra is not None:
+            vectors.append(extra[0])
+            ids.append(extra[1])
+
+        dimension = shard['index'].d
+        if vectors:
+            vectors = np.vstack(vectors)
+            ids = np.concatenate(ids)
+        else:
+            vectors = np.empty((0, dimension), dtype='float32')
+            ids = np.empty(0, dtype='int64')
+
+        if kind == 'ivf' and not len(vectors):
+            # IVF needs training data; an empty shard stays exact
+            kind = 'flat'
+
+        index = self._new_index(kind, dimension, vectors)
+        if len(vectors):
+            index.add_with_ids(vectors, ids)
+
+        shard['index'] = index
+        shard['kind'] = kind
+        self.logger.info(f"Built {kind} index for shard {shard_id} with {index.ntotal} vectors")
+
+    def _new_index(self, kind: str, dimension: int, training_vectors: np.ndarray = None):
+        """Create an empty index of the given kind that accepts explicit vector IDs"""
+        if kind == 'ivf' and training_vectors is not None and len(training_vectors):
+            nlist = max(1, int(np.sqrt(len(training_vectors))))
+            quantizer = faiss.IndexFlatL2(dimension)
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+            index.train(training_vectors)
+            # Lets reconstruct_batch() look vectors up by ID
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return index
+        if kind == 'hnsw':
+            return faiss.IndexIDMap2(faiss.IndexHNSWFlat(dimension, 32))
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+    def _search_index(self, shard: Dict, query_embedding: np.ndarray, k: int, id_range: Tuple[int, int] = None):
+        """Search a shard, optionally restricted to a vector ID range"""
+        selector = {'sel': faiss.IDSelectorRange(*id_range)} if id_range else {}
+
+        if shard['kind'] == 'ivf':
+            params = faiss.SearchParametersIVF(nprobe=self.ivf_nprobe, **selector)
+        elif shard['kind'] == 'hnsw':
+            params = faiss.SearchParametersHNSW(efSearch=self.hnsw_ef_search, **selector)
+        else:
+            params = faiss.SearchParameters(**selector) if selector else None
+
+        return shard['index'].search(query_embedding, k, params=params)
+
+    def _search_document(self, document_id: int, query_embedding: np.ndarray, k: int) -> List[int]:
+        """Top-k chunk indices of one document"""
+        shard = self._get_shard(self._shard_id(document_id))
+        _, ids = self._search_index(shard, query_embedding, k, self._id_range(document_id))
+
+        chunk_indices = [self._decode_vector_id(int(i))[1] for i in ids[0] if i != -1]
+        if len(chunk_indices) < k:
+            # Filtered ANN search can come up short, fall back to exact search over the document
+            embeddings = self._reconstruct(shard, document_id)
+            distances = np.linalg.norm(embeddings - query_embedding[0], axis=1)
+            chunk_indices = np.argsort(distances)[:k].tolist()
+        return chunk_indices
+
+    def _get_shard(self, shard_id: int):
+        """Get a shard, loading it from disk if it is not cached or another process has replaced it"""
+        shard = self.shards.get(shard_id)
+        if shard is not None and shard['version'] == self._shard_version(shard_id):
+            return shard
+
+        shard = self._load_shard(shard_id)
+        if shard is not None:
+            self.shards[shard_id] = shard
+        return shard
+
+    def _writable_shard(self, shard_id: int):
+        """Private copy of a shard to modify, taken while holding its lock"""
+        shard = self.shards.get(shard_id)
+        if shard is not None and shard['version'] == self._shard_version(shard_id):
+            return dict(shard, index=faiss.clone_index(shard['index']), documents=dict(shard['documents']))
+        return self._load_shard(shard_id)
+
+    @contextmanager
+    def _locked_shard(self, shard_id: int):
+        """Exclusive access to a shard for a load-modify-save, across threads and worker processes"""
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        with self._write_lock, open(f"{SHARD_DIR}/shard_{shard_id}.lock", 'a') as lock_file:
+            if fcntl:
+                # Released when the lock file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _shard_path(self, shard_id: int) -> str:
+        return f"{SHARD_DIR}/shard_{shard_id}.index"
+
+    def _shard_version(self, shard_id: int):
+        """Identity of a shard's file on disk; it changes whenever any process replaces the file"""
+        try:
+            return self._file_version(os.stat(self._shard_path(shard_id)))
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _file_version(stat: os.stat_result) -> Tuple[int, int, int]:
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _save_shard(self, shard_id: int, shard: Dict):
+        """Save a shard's metadata and index as one file, replacing the previous one atomically.
+
+        Errors are raised, so callers never cache a shard that other workers will not see.
+        """
+        path = self._shard_path(shard_id)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            with open(temporary_path, 'wb') as f:
+                # A JSON metadata line followed by the serialized index
+                f.write(json.dumps({'kind': shard['kind'], 'documents': shard['documents']}).encode('utf-8') + b'\n')
+                f.write(faiss.serialize_index(shard['index']).tobytes())
+            os.replace(temporary_path, path)
+        except Exception:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        shard['version'] = self._file_version(os.stat(path))
+
+    def _load_shard(self, shard_id: int):
+        """Load a shard's index and metadata from disk"""
+        if not faiss:
+            return None
+
+        try:
+            try:
+                with open(self._shard_path(shard_id), 'rb') as f:
+                    metadata = json.loads(f.readline())
+                    index = faiss.deserialize_index(np.frombuffer(f.read(), dtype='uint8'))
+                    version = self._file_version(os.fstat(f.fileno()))
+            except FileNotFoundError:
+                return None
+
+            return {
+                'index': index,
+                'kind': metadata['kind'],
+                'documents': {int(document_id): count for document_id, count in metadata['documents'].items()},
+                'version': version
+            }
+
+        except Exception as e:
+            self.logger.error(f"Error loading shard {shard_id}: {str(e)}")
+            return None
+
+    def _shard_ids(self) -> List[int]:
+        """IDs of every shard saved on disk"""
+        if not os.path.exists(SHARD_DIR):
+            return []
+
+        return sorted(
+            int(name[len("shard_"):-len(".index")])
+            for name in os.listdir(SHARD_DIR)
+            if name.startswith("shard_") and name.endswith(".index")
+        )
+
+    def _save_to_disk(self, document_id: int, chunks: List[Dict]):
+        """Save document chunks to disk"""
         try:
             cache_dir = f"models_cache/doc_{document_id}"
             os.makedirs(cache_dir, exist_ok=True)
-            
-            # Save FAISS index if available
-            if document_id in self.indices and faiss:
-                faiss.write_index(self.indices[document_id], f"{cache_dir}/index.faiss")
-            
-            # Save chunks and embeddings
-            with open(f"{cache_dir}/chunks.pkl", 'wb') as f:
-                pickle.dump(self.chunks.get(document_id, []), f)
-            
-            with open(f"{cache_dir}/embeddings.pkl", 'wb') as f:
-                pickle.dump(self.embeddings.get(document_id, []), f)
-                
+
+            # Chunks as an offset-indexed text file
+            ChunkFile.write(self._chunks_prefix(document_id), chunks)
+
+            # Drop files written by earlier formats; vectors now live only in the shard index
+            for name in ('chunks.pkl', 'embeddings.pkl', 'index.faiss'):
+                if os.path.exists(f"{cache_dir}/{name}"):
+                    os.remove(f"{cache_dir}/{name}")
+
         except Exception as e:
             self.logger.error(f"Error saving to disk for document {document_id}: {str(e)}")
-    
-    def _load_from_disk(self, document_id: int):
-        """Load document embeddings from disk"""
+
+    def _chunks_prefix(self, document_id: int) -> str:
+        return f"models_cache/doc_{document_id}/chunks"
+
+    def _load_chunks(self, document_id: int):
+        """Open a document's chunk file into the cache"""
         try:
-            cache_dir = f"models_cache/doc_{document_id}"
-            
-            if not os.path.exists(cache_dir):
-                return
-            
-            # Load FAISS index if available
-            index_path = f"{cache_dir}/index.faiss"
-            if os.path.exists(index_path) and faiss:
-                self.indices[document_id] = faiss.read_index(index_path)
-            
-            # Load chunks
-            chunks_path = f"{cache_dir}/chunks.pkl"
-            if os.path.exists(chunks_path):
-                with open(chunks_path, 'rb') as f:
-                    self.chunks[document_id] = pickle.load(f)
-            
-            # Load embeddings
-            embeddings_path = f"{cache_dir}/embeddings.pkl"
-            if os.path.exists(embeddings_path):
-                with open(embeddings_path, 'rb') as f:
-                    self.embeddings[document_id] = pickle.load(f)
-                    
+            prefix = self._chunks_prefix(document_id)
+            if not ChunkFile.exists(prefix):
+                return None
+
+            chunks = ChunkFile(prefix)
+            self.chunks[document_id] = chunks
+            return chunks
+
         except Exception as e:
-            self.logger.error(f"Error loading from disk for document {document_id}: {str(e)}")
-    
+            self.logger.error(f"Error loading chunks from disk for document {document_id}: {str(e)}")
+            return None
+
+    def has_document(self, document_id: int) -> bool:
+        """Whether chunks for a document are available in memory or on disk"""
+        return bool(self.get_document_chunks(document_id))
+
+    def _canonical_id(self, document_id: int) -> int:
+        """ID whose chunks and vectors serve a document: its source if it was shared from an identical one.
+
+        Read from disk every time: deleting a source re-points its duplicates from whichever process deletes it.
+        """
+        try:
+            with open(f"models_cache/doc_{document_id}/source.json") as f:
+                return json.load(f)['source']
+        except FileNotFoundError:
+            return document_id
+
+    def share_document(self, source_id: int, target_id: int):
+        """Serve a new document id from the chunks and vectors of an identical document, without copying them"""
+        try:
+            source_id = self._canonical_id(source_id)
+            target_dir = f"models_cache/doc_{target_id}"
+            os.makedirs(target_dir, exist_ok=True)
+            with open(f"{target_dir}/source.json", 'w') as f:
+                json.dump({'source': source_id}, f)
+
+        except Exception as e:
+            self.logger.error(f"Error sharing document {source_id} with {target_id}: {str(e)}")
+
+    def _remove_source(self, document_id: int):
+        """Stop serving a document from the document it was shared from"""
+        source_path = f"models_cache/doc_{document_id}/source.json"
+        if os.path.exists(source_path):
+            os.remove(source_path)
+
+    def _shared_with(self, document_id: int) -> List[int]:
+        """IDs of the documents served from a document's chunks and vectors"""
+        sharing = []
+        for source_path in glob.glob("models_cache/doc_*/source.json"):
+            with open(source_path) as f:
+                if json.load(f)['source'] == document_id:
+                    sharing.append(int(os.path.basename(os.path.dirname(source_path))[len('doc_'):]))
+        return sorted(sharing)
+
+    def _hand_over(self, document_id: int, heir_id: int):
+        """Make a document that shares another's entries their owner, so the other can be deleted"""
+        chunks = self.get_document_chunks(document_id)
+        embeddings = self.get_document_embeddings(document_id)
+
+        # Vector IDs and keyword postings are keyed by document, so they are added again under the heir
+        if embeddings is not None:
+            self._add_to_index(heir_id, embeddings)
+        if chunks:
+            self.keyword_index.add_document(heir_id, [chunk['text'] for chunk in chunks])
+            # Readers that mapped the file under its old name keep a valid view of it
+            os.replace(f"{self._chunks_prefix(document_id)}.data", f"{self._chunks_prefix(heir_id)}.data")
+
+        # Only now that the heir owns everything does it stop being served from the document
+        self._remove_source(heir_id)
+
     def delete_document(self, document_id: int):
         """Delete document embeddings"""
         try:
+            if self._canonical_id(document_id) != document_id:
+                # A shared document owns nothing but the link to its source
+                shutil.rmtree(f"models_cache/doc_{document_id}", ignore_errors=True)
+                return
+
+            # Duplicates of the document keep their entries: the first becomes their owner
+            sharing = self._shared_with(document_id)
+            if sharing:
+                heir_id = sharing[0]
+                self._hand_over(document_id, heir_id)
+                for other_id in sharing[1:]:
+                    self.share_document(heir_id, other_id)
+
+            # Remove from the library-wide index
+            shard_id = self._shard_id(document_id)
+            with self._locked_shard(shard_id):
+                shard = self._writable_shard(shard_id)
+                if shard and document_id in shard['documents']:
+                    self._remove_from_shard(shard_id, shard, document_id)
+                    self._save_shard(shard_id, shard)
+                    self.shards[shard_id] = shard
+
+            self.keyword_index.remove_document(document_id)
+
             # Remove from memory
-            if document_id in self.indices:
-                del self.indices[document_id]
-            if document_id in self.chunks:
-                del self.chunks[document_id]
-            if document_id in self.embeddings:
-                del self.embeddings[document_id]
-            
+            self.chunks.pop(document_id)
+
             # Remove from disk
             cache_dir = f"models_cache/doc_{document_id}"
             if os.path.exists(cache_dir):
-                import shutil
                 shutil.rmtree(cache_dir)
-                
+
         except Exception as e:
             self.logger.error(f"Error deleting document {document_id}: {str(e)}")
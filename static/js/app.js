@@ -202,6 +202,41 @@ function handleApiError(error, fallbackMessage = 'An error occurred') {
     }
 }
 
+// Read a text/event-stream response, calling onEvent(event, data) for each server-sent event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            
+            if (data) {
+                onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+}
+
 // Loading state management
 const LoadingStates = {
     buttons: new Map(),
@@ -371,6 +406,7 @@ window.AppUtils = {
     scrollToElement,
     isElementInViewport,
     handleApiError,
+    readEventStream,
     LoadingStates,
     Storage,
     Session
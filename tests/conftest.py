@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def pytest_sessionstart(session):
+    # Importing the app connects to DATABASE_URL and creates its upload and
+    # model cache directories under the working directory, so point both at
+    # a scratch directory first
+    work_dir = tempfile.mkdtemp(prefix='research-assistant-tests-')
+    os.chdir(work_dir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'test.db')}"
+
+    # The services import the app's db, so the app is imported first, as when it is served
+    import app  # noqa: F401
+
+@pytest.fixture
+def app():
+    """The Flask app with empty tables"""
+    from app import app, db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,49 @@
+import pytest
+from services.bm25_index import BM25Index, tokenize
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / 'bm25.sqlite'))
+    index.add_document(1, [
+        'Solar panels convert sunlight into electricity.',
+        'Wind turbines generate electricity from wind.',
+        'The history of the printing press.',
+    ])
+    index.add_document(2, [
+        'Sunlight and photosynthesis in plants.',
+        'Electricity prices rose last year.',
+    ])
+    return index
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize('The Solar-Panel is ON') == ['solar', 'panel']
+
+def test_search_document_ranks_matching_chunks(index):
+    results = index.search_document(1, 'solar sunlight', k=5)
+
+    assert [chunk for chunk, _ in results] == [0]
+    assert {chunk for chunk, _ in index.search_document(1, 'electricity', k=5)} == {0, 1}
+    assert index.search_document(1, 'the of', k=5) == []
+
+def test_search_covers_every_document(index):
+    results = index.search('sunlight', k=5)
+
+    assert {(document_id, chunk) for document_id, chunk, _ in results} == {(1, 0), (2, 0)}
+    scores = [score for _, _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+def test_add_document_replaces_previous_entries(index):
+    index.add_document(1, ['Printing presses only.'])
+
+    assert index.search_document(1, 'solar', k=5) == []
+    assert index.search_document(1, 'printing', k=5)[0][0] == 0
+    assert index.stats()['chunks'] == 3
+
+def test_remove_document(index):
+    index.remove_document(1)
+
+    assert not index.has_document(1)
+    assert index.has_document(2)
+    assert index.search_document(1, 'solar', k=5) == []
+    assert {document_id for document_id, _, _ in index.search('electricity sunlight', k=5)} == {2}
+    assert index.stats()['chunks'] == 2
@@ -0,0 +1,51 @@
+import os
+import pytest
+from services.chunk_file import ChunkFile
+
+CHUNKS = [
+    {'text': 'First chunk', 'start_pos': 0, 'end_pos': 11, 'page': 1},
+    {'text': 'Zweiter Abschnitt mit Umlauten: äöü', 'start_pos': 11, 'end_pos': 46, 'page': 2},
+    {'text': 'No page', 'start_pos': 46, 'end_pos': 53},
+]
+
+@pytest.fixture
+def prefix(tmp_path):
+    return str(tmp_path / 'chunks')
+
+def test_round_trip(prefix):
+    ChunkFile.write(prefix, CHUNKS)
+    chunks = ChunkFile(prefix)
+
+    assert len(chunks) == 3
+    assert list(chunks) == [dict(chunk, id=i) for i, chunk in enumerate(CHUNKS)]
+    assert chunks[-1]['text'] == 'No page'
+    with pytest.raises(IndexError):
+        chunks[3]
+
+def test_empty_file(prefix):
+    ChunkFile.write(prefix, [])
+
+    assert len(ChunkFile(prefix)) == 0
+
+def test_version_changes_after_rewrite(prefix):
+    assert ChunkFile.current_version(prefix) is None
+
+    ChunkFile.write(prefix, CHUNKS)
+    chunks = ChunkFile(prefix)
+    assert chunks.version == ChunkFile.current_version(prefix)
+
+    ChunkFile.write(prefix, CHUNKS[:1])
+    assert ChunkFile.current_version(prefix) != chunks.version
+    # The file opened before the rewrite still reads the old chunks
+    assert chunks[2]['text'] == 'No page'
+    assert len(ChunkFile(prefix)) == 1
+
+def test_rejects_other_files(prefix):
+    with open(f"{prefix}.data", 'wb') as f:
+        f.write(b'\0' * 64)
+
+    with pytest.raises(ValueError):
+        ChunkFile(prefix)
+    assert ChunkFile.exists(prefix)
+    os.remove(f"{prefix}.data")
+    assert not ChunkFile.exists(prefix)
@@ -0,0 +1,52 @@
+import os
+import pytest
+from services.content_store import ContentStore
+
+# Multi-byte characters make sure blocks are cut by characters, not bytes
+TEXT = ''.join(f"{i:03d}äß€ " for i in range(100))
+
+@pytest.fixture
+def store(tmp_path):
+    return ContentStore(str(tmp_path / 'content'), block_chars=16)
+
+def test_round_trip(store):
+    key = store.put(TEXT)
+
+    assert store.exists(key)
+    assert store.get(key) == TEXT
+
+@pytest.mark.parametrize('start, length', [
+    (0, 16), (0, 17), (15, 2), (16, 16), (10, 40), (5, None), (len(TEXT) - 3, 10), (len(TEXT), 5), (3, 0),
+])
+def test_read_ranges_across_block_boundaries(store, start, length):
+    key = store.put(TEXT)
+
+    expected = TEXT[start:] if length is None else TEXT[start:start + length]
+    assert store.read(key, start, length) == expected
+
+def test_identical_texts_share_one_blob(store):
+    key = store.put(TEXT)
+    path = store._path(key)
+    modified = os.stat(path).st_mtime_ns
+
+    assert store.put(TEXT) == key
+    assert os.stat(path).st_mtime_ns == modified
+    assert store.put(TEXT + '!') != key
+
+def test_empty_text_and_missing_key(store):
+    key = store.put('')
+
+    assert store.get(key) == ''
+    assert store.read(None) == ''
+    assert not store.exists(None)
+    assert not store.exists('0' * 64)
+
+def test_failed_write_leaves_no_temporary_file(store, monkeypatch):
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, 'replace', fail)
+
+    with pytest.raises(OSError):
+        store.put(TEXT)
+
+    assert [files for _, _, files in os.walk(store.root)] == [[], []]
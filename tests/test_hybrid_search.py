@@ -0,0 +1,45 @@
+from services.hybrid_search import Reranker, reciprocal_rank_fusion
+
+def test_rrf_favours_items_ranked_high_in_both_lists():
+    dense = ['a', 'b', 'c', 'd']
+    keyword = ['c', 'a', 'e']
+
+    assert reciprocal_rank_fusion([dense, keyword]) == ['a', 'c', 'b', 'e', 'd']
+
+def test_rrf_scores_by_rank_only():
+    fused = reciprocal_rank_fusion([[1, 2], [2, 1]], k=60)
+
+    # Equal scores keep the order items were first seen in
+    assert fused == [1, 2]
+
+def test_rrf_with_a_single_ranking_keeps_its_order():
+    assert reciprocal_rank_fusion([[3, 1, 2]]) == [3, 1, 2]
+    assert reciprocal_rank_fusion([]) == []
+
+class LengthModel:
+    """Cross-encoder stand-in scoring longer passages higher"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, pairs):
+        self.calls += 1
+        return [len(text) for _, text in pairs]
+
+def test_reranker_orders_by_model_score():
+    reranker = Reranker(LengthModel, budget_ms=1000, batch_size=2)
+
+    assert reranker.rerank('q', ['aa', 'a', 'aaaa', 'aaa']) == [2, 3, 0, 1]
+
+def test_reranker_without_model_keeps_order():
+    reranker = Reranker(lambda: None, budget_ms=1000)
+
+    assert reranker.rerank('q', ['a', 'aa']) == [0, 1]
+
+def test_reranker_zero_budget_scores_only_the_first_batch():
+    model = LengthModel()
+    reranker = Reranker(lambda: model, budget_ms=0, batch_size=2)
+
+    assert reranker.rerank('q', ['a', 'aa', 'aaaa', 'aaa']) == [1, 0, 2, 3]
+    assert model.calls == 1
+    assert reranker.stats()['truncated'] == 1
@@ -0,0 +1,118 @@
+import time
+import threading
+import pytest
+from services.inference_scheduler import InferenceScheduler, QueueFullError
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def waiting(scheduler):
+    return sum(priority['waiting'] for priority in scheduler.stats()['priorities'].values())
+
+class HeldSlot:
+    """Holds a scheduler slot on another thread until released"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.acquired = threading.Event()
+        self.release = threading.Event()
+        self.thread = threading.Thread(target=self._hold)
+        self.thread.start()
+        self.acquired.wait()
+
+    def _hold(self):
+        with self.scheduler.slot():
+            self.acquired.set()
+            self.release.wait()
+
+    def stop(self):
+        self.release.set()
+        self.thread.join()
+
+def queue_caller(scheduler, priority, served):
+    def run():
+        with scheduler.slot(priority):
+            served.append(priority)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_serves_waiting_callers_by_priority():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=10)
+    held = HeldSlot(scheduler)
+    served = []
+
+    threads = []
+    for priority in (InferenceScheduler.BACKGROUND, InferenceScheduler.NORMAL, InferenceScheduler.INTERACTIVE):
+        threads.append(queue_caller(scheduler, priority, served))
+        wait_until(lambda: waiting(scheduler) == len(threads))
+
+    held.stop()
+    for thread in threads:
+        thread.join()
+
+    assert served == [InferenceScheduler.INTERACTIVE, InferenceScheduler.NORMAL, InferenceScheduler.BACKGROUND]
+
+def test_rejects_interactive_callers_past_queue_depth():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=1)
+    held = HeldSlot(scheduler)
+    served = []
+    queued = queue_caller(scheduler, InferenceScheduler.INTERACTIVE, served)
+    wait_until(lambda: waiting(scheduler) == 1)
+
+    assert not scheduler.has_capacity(InferenceScheduler.INTERACTIVE)
+    with pytest.raises(QueueFullError):
+        with scheduler.slot(InferenceScheduler.INTERACTIVE):
+            pass
+    assert scheduler.stats()['rejected'] == 1
+
+    # Background work always queues
+    assert scheduler.has_capacity(InferenceScheduler.BACKGROUND)
+    background = queue_caller(scheduler, InferenceScheduler.BACKGROUND, served)
+    wait_until(lambda: waiting(scheduler) == 2)
+
+    held.stop()
+    queued.join()
+    background.join()
+    assert served == [InferenceScheduler.INTERACTIVE, InferenceScheduler.BACKGROUND]
+
+def test_releases_slot_when_the_block_raises():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=1)
+
+    with pytest.raises(RuntimeError):
+        with scheduler.slot():
+            raise RuntimeError("generation failed")
+
+    assert scheduler.stats()['in_flight'] == 0
+    with scheduler.slot() as slot:
+        assert slot == 0
+
+def test_stream_route_returns_503_when_queue_is_full(app, client, monkeypatch):
+    from app import db
+    from models import Document
+    import routes
+
+    with app.app_context():
+        document = Document(filename='a.txt', original_filename='a.txt', file_path='uploads/a.txt',
+                            file_type='txt', processed=True)
+        db.session.add(document)
+        db.session.commit()
+        document_id = document.id
+
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=1)
+    monkeypatch.setattr(routes.ai_service, 'scheduler', scheduler)
+    held = HeldSlot(scheduler)
+    queued = queue_caller(scheduler, InferenceScheduler.INTERACTIVE, [])
+    wait_until(lambda: waiting(scheduler) == 1)
+
+    try:
+        response = client.post('/ask/stream', json={'document_id': document_id, 'question': 'What is it about?'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+    finally:
+        held.stop()
+        queued.join()
@@ -0,0 +1,85 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from services.ingestion_service import IngestionService
+
+@pytest.fixture
+def service(app):
+    service = IngestionService(app, None, None, None, None)
+    service.runs = []
+    # A single stage that records which jobs ran
+    service.stages = ('record',)
+    service._record = lambda job, document, state: service.runs.append(job.id)
+    service.submitted = []
+    service.submit = service.submitted.append
+    return service
+
+def add_job(app, status='queued', started_date=None):
+    from app import db
+    from models import Document, IngestionJob
+
+    with app.app_context():
+        document = Document(filename='a.txt', original_filename='a.txt', file_path='uploads/a.txt', file_type='txt')
+        db.session.add(document)
+        db.session.flush()
+        job = IngestionJob(id=str(uuid.uuid4()), document_id=document.id, status=status, started_date=started_date)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+def job_status(app, job_id):
+    from app import db
+    from models import IngestionJob
+
+    with app.app_context():
+        return db.session.get(IngestionJob, job_id).status
+
+def test_run_job_completes_and_runs_only_once(app, service):
+    job_id = add_job(app)
+
+    service._run_job(job_id)
+    service._run_job(job_id)
+
+    assert service.runs == [job_id]
+    assert job_status(app, job_id) == 'completed'
+
+def test_run_job_skips_job_claimed_elsewhere(app, service):
+    job_id = add_job(app, status='running', started_date=datetime.utcnow())
+
+    service._run_job(job_id)
+
+    assert service.runs == []
+    assert job_status(app, job_id) == 'running'
+
+def test_resume_interrupted_requeues_queued_and_running_jobs(app, service):
+    queued = add_job(app)
+    running = add_job(app, status='running', started_date=datetime.utcnow())
+    completed = add_job(app, status='completed')
+
+    service.resume_interrupted()
+
+    assert sorted(service.submitted) == sorted([queued, running])
+    assert job_status(app, running) == 'queued'
+    assert job_status(app, completed) == 'completed'
+
+def test_resume_interrupted_stale_only_leaves_recent_jobs_running(app, service):
+    service.stale_after = 60
+    queued = add_job(app)
+    stale = add_job(app, status='running', started_date=datetime.utcnow() - timedelta(seconds=120))
+    recent = add_job(app, status='running', started_date=datetime.utcnow())
+
+    service.resume_interrupted(stale_only=True)
+
+    assert sorted(service.submitted) == sorted([queued, stale])
+    assert job_status(app, stale) == 'queued'
+    assert job_status(app, recent) == 'running'
+
+def test_resumed_job_runs_once(app, service):
+    job_id = add_job(app, status='running', started_date=datetime.utcnow() - timedelta(hours=2))
+
+    service.resume_interrupted()
+    for submitted in service.submitted:
+        service._run_job(submitted)
+    service._run_job(job_id)
+
+    assert service.runs == [job_id]
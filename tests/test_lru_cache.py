@@ -0,0 +1,51 @@
+import pytest
+from services.lru_cache import LRUCache
+
+def test_evicts_least_recently_used_past_byte_budget():
+    cache = LRUCache(10, len)
+    cache['a'] = 'xxxx'
+    cache['b'] = 'xxxx'
+    cache['a']  # 'a' is now the most recently used
+    cache['c'] = 'xxxx'
+
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.stats()['bytes'] == 8
+    assert cache.evictions == 1
+
+def test_replacing_an_entry_updates_its_size():
+    cache = LRUCache(10, len)
+    cache['a'] = 'xxxxxxxx'
+    cache['a'] = 'xx'
+    cache['b'] = 'xxxxxxxx'
+
+    assert 'a' in cache and 'b' in cache
+    assert cache.stats()['bytes'] == 10
+
+def test_keeps_an_entry_larger_than_the_budget():
+    cache = LRUCache(4, len)
+    cache['a'] = 'xx'
+    cache['b'] = 'xxxxxxxx'
+
+    assert 'a' not in cache
+    assert cache['b'] == 'xxxxxxxx'
+
+def test_pop_and_delete_release_bytes():
+    cache = LRUCache(10, len)
+    cache['a'] = 'xxxx'
+    cache['b'] = 'xxxx'
+
+    assert cache.pop('a') == 'xxxx'
+    del cache['b']
+
+    assert cache.stats()['bytes'] == 0
+    with pytest.raises(KeyError):
+        cache['a']
+
+def test_counts_hits_and_misses():
+    cache = LRUCache(10, len)
+    cache['a'] = 'x'
+    cache.get('a')
+    cache.get('b')
+
+    assert cache.stats()['hit_rate'] == 0.5
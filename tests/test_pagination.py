@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+import pytest
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def document_ids(app):
+    """Seven documents; several share an upload date, so the cursor's ID breaks ties"""
+    from app import db
+    from models import Document, Question
+
+    with app.app_context():
+        documents = [
+            Document(filename=f'{i}.txt', original_filename=f'{i}.txt', file_path=f'uploads/{i}.txt', file_type='txt',
+                     upload_date=START + timedelta(minutes=i // 3))
+            for i in range(7)
+        ]
+        db.session.add_all(documents)
+        db.session.flush()
+        db.session.add_all(
+            Question(document_id=documents[0].id, question_text=f'Question {i}', question_type='user',
+                     created_date=START + timedelta(seconds=i // 2))
+            for i in range(5)
+        )
+        db.session.commit()
+        return [document.id for document in documents]
+
+def fetch_all(client, url, limit):
+    """Follow X-Next-Cursor through every page"""
+    pages = []
+    cursor = None
+    while True:
+        response = client.get(url, query_string={'limit': limit, **({'before': cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return pages
+
+def test_document_pages_follow_the_cursor(client, document_ids):
+    pages = fetch_all(client, '/api/documents', limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    # Newest first, ties broken by the higher ID
+    assert [document['id'] for page in pages for document in page] == document_ids[::-1]
+
+def test_last_full_page_has_no_cursor(client, document_ids):
+    response = client.get('/api/documents', query_string={'limit': 7})
+
+    assert len(response.get_json()) == 7
+    assert 'X-Next-Cursor' not in response.headers
+
+def test_history_pages_follow_the_cursor(client, document_ids):
+    pages = fetch_all(client, f'/api/document/{document_ids[0]}/history', limit=2)
+
+    assert [question['question'] for page in pages for question in page] == [f'Question {i}' for i in range(4, -1, -1)]
+
+@pytest.mark.parametrize('args', [
+    {'limit': 'ten'},
+    {'before': 'not-a-cursor'},
+    {'before': 'yesterday_5'},
+    {'before': '2024-01-01T12:00:00_x'},
+])
+def test_bad_limit_or_cursor_is_rejected(client, document_ids, args):
+    for url in ('/api/documents', f'/api/document/{document_ids[0]}/history'):
+        response = client.get(url, query_string=args)
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+def test_limit_is_clamped(client, document_ids):
+    assert len(client.get('/api/documents', query_string={'limit': 0}).get_json()) == 1
+    assert len(client.get('/api/documents', query_string={'limit': 1000}).get_json()) == 7
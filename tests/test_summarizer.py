@@ -0,0 +1,59 @@
+import copy
+import pytest
+from services.document_processor import DocumentProcessor
+from services.inference_scheduler import InferenceScheduler
+from services.summarizer import MapReduceSummarizer
+
+TEXT = ' '.join(f"Section {i} talks about topic {i} in some detail." for i in range(12))
+
+class RecordingAIService:
+    """Stands in for AIService, recording the passages it is asked to summarize"""
+
+    def __init__(self, fail_on: str = None):
+        self.scheduler = InferenceScheduler(max_concurrency=1)
+        self.fail_on = fail_on
+        self.passages = []
+        self.used_llm = []
+
+    def summarize_passage(self, text, max_words=80, priority=InferenceScheduler.BACKGROUND, use_llm=True, document=None):
+        if text == self.fail_on:
+            raise RuntimeError("interrupted")
+        self.passages.append(text)
+        self.used_llm.append(use_llm)
+        return f"<{text}>"
+
+    def combine_summaries(self, summaries, max_words=150, priority=InferenceScheduler.BACKGROUND, use_llm=True):
+        return '[' + ' '.join(summaries) + ']'
+
+def summarizer(ai_service, time_budget=None):
+    return MapReduceSummarizer(DocumentProcessor(), ai_service, chunk_size=100, reduce_batch=2, time_budget=time_budget)
+
+def test_resumes_from_checkpoint():
+    chunks = summarizer(RecordingAIService())._chunks(TEXT)
+    assert len(chunks) > 3
+    expected = summarizer(RecordingAIService()).summarize(TEXT)
+
+    checkpoints = []
+    interrupted = RecordingAIService(fail_on=chunks[2])
+    with pytest.raises(RuntimeError):
+        summarizer(interrupted).summarize(TEXT, save_checkpoint=lambda checkpoint: checkpoints.append(copy.deepcopy(checkpoint)))
+    assert checkpoints[-1]['levels'][0][:2] == [f"<{chunks[0]}>", f"<{chunks[1]}>"]
+
+    resumed = RecordingAIService()
+    assert summarizer(resumed).summarize(TEXT, checkpoints[-1]) == expected
+    assert resumed.passages == chunks[2:]
+
+def test_ignores_checkpoint_from_other_chunking():
+    checkpoint = {'chunk_size': 50, 'reduce_batch': 2, 'levels': [['stale']]}
+    ai_service = RecordingAIService()
+
+    summarizer(ai_service).summarize(TEXT, checkpoint)
+
+    assert ai_service.passages == summarizer(RecordingAIService())._chunks(TEXT)
+
+def test_zero_time_budget_skips_the_llm_for_sections():
+    ai_service = RecordingAIService()
+
+    summarizer(ai_service, time_budget=0).summarize(TEXT)
+
+    assert ai_service.used_llm and not any(ai_service.used_llm)